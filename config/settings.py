@@ -89,6 +89,23 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 'fragments' holds rendered supply table rows; its keys change whenever a
+# row's content would, so entries are never invalidated, only evicted
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -129,10 +146,35 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Uploaded files (queued import jobs)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Materialised export files, one per catalog version, format and filter set
+EXPORT_SNAPSHOT_DIR = BASE_DIR / 'export_snapshots'
+
 # WhiteNoise configuration
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 WHITENOISE_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# Email (low-stock alert digests)
+# https://docs.djangoproject.com/en/5.2/topics/email/
+# Printed to the console unless a backend is configured; use
+# django.core.mail.backends.filebased.EmailBackend with EMAIL_FILE_PATH to keep them
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', BASE_DIR / 'sent_emails')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'inventory@localhost')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'False') == 'True'
+
+# Addresses low-stock digests go to (comma separated); editors and admins with an email if empty
+LOW_STOCK_ALERT_RECIPIENTS = [address for address in os.environ.get('LOW_STOCK_ALERT_RECIPIENTS', '').split(',') if address]
+# Seconds during which a supply that was alerted is not alerted again
+LOW_STOCK_ALERT_WINDOW = int(os.environ.get('LOW_STOCK_ALERT_WINDOW', 24 * 60 * 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Supply, Category, Tag
+from .models import Supply, Category, Tag, ImportJob, LowStockAlert
 
 class SupplyAdmin(admin.ModelAdmin):
     list_display = ('name', 'price', 'quantity', 'location', 'category')  
@@ -17,8 +17,20 @@ class TagAdmin(admin.ModelAdmin):
     search_fields = ('name',)
     ordering = ('name',)
 
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'original_name', 'status', 'rows_done', 'user', 'created_at', 'finished_at')
+    list_filter = ('status',)
+    ordering = ('-created_at',)
+
+class LowStockAlertAdmin(admin.ModelAdmin):
+    list_display = ('supply_name', 'quantity', 'reorder_point', 'status', 'created_at', 'delivered_at')
+    list_filter = ('status',)
+    ordering = ('-created_at',)
+
 admin.site.register(Supply, SupplyAdmin)
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(Tag, TagAdmin)
+admin.site.register(ImportJob, ImportJobAdmin)
+admin.site.register(LowStockAlert, LowStockAlertAdmin)
 
 
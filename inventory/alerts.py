@@ -0,0 +1,139 @@
+# Low-Stock Alerts Module
+# Delivers the low-stock alert outbox (filled by database triggers, see
+# migration 0012) as batched email digests, collapsing repeats and flapping
+
+
+import logging
+from datetime import timedelta
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import LowStockAlert
+
+# A supply alerted within this many seconds is not alerted again
+ALERT_WINDOW = getattr(settings, 'LOW_STOCK_ALERT_WINDOW', 24 * 60 * 60)
+
+# Supplies listed in one digest email; the rest are counted
+DIGEST_LIMIT = 200
+
+# Outbox entries settled per statement
+UPDATE_BATCH = 500
+
+logger = logging.getLogger(__name__)
+
+
+def alert_recipients():
+    """
+    Return the addresses digests are sent to
+
+    LOW_STOCK_ALERT_RECIPIENTS if set, otherwise every active editor or admin
+    with an email address.
+
+    Returns:
+        list: Email addresses
+    """
+    recipients = getattr(settings, 'LOW_STOCK_ALERT_RECIPIENTS', None)
+    if recipients:
+        return list(recipients)
+    editors = User.objects.filter(Q(is_staff=True) | Q(is_superuser=True), is_active=True).exclude(email='')
+    return sorted(set(editors.values_list('email', flat=True)))
+
+
+def settle(alert_ids, status, now):
+    for start in range(0, len(alert_ids), UPDATE_BATCH):
+        LowStockAlert.objects.filter(id__in=alert_ids[start:start + UPDATE_BATCH], status='PENDING').update(
+            status=status, delivered_at=now)
+
+
+def digest_body(entries):
+    lines = [f'{len(entries)} supplies reached their reorder point:', '']
+    for entry in entries[:DIGEST_LIMIT]:
+        lines.append(f"- {entry['supply__name']} ({entry['supply__location']}): "
+                     f"{entry['supply__quantity']} in stock, reorder point {entry['supply__reorder_point']}")
+    if len(entries) > DIGEST_LIMIT:
+        lines.append(f'... and {len(entries) - DIGEST_LIMIT} more, see the low stock page.')
+    return '\n'.join(lines)
+
+
+def deliver_alerts(recipients=None, window=ALERT_WINDOW, dry_run=False):
+    """
+    Send one digest covering every pending alert and settle the outbox
+
+    Pending entries of a supply are collapsed into one. A supply that is no
+    longer low (restocked before the digest went out) or was deleted is
+    settled as RESOLVED, and one already alerted within the window as
+    SUPPRESSED, so a flapping supply alerts once per window. The outbox is
+    read and settled in two short transactions with the email sent between
+    them, so no rows stay locked for the mail server round trip. It is only
+    settled if the email was sent: a failed send is logged and leaves it
+    pending for the next run, so an alert may repeat but is never lost.
+
+    Args:
+        recipients (list, optional): Addresses to send to. Defaults to alert_recipients().
+        window (int, optional): Dedupe window in seconds. Defaults to ALERT_WINDOW.
+        dry_run (bool, optional): Build the digest without sending or settling anything
+
+    Returns:
+        dict: Counts of 'sent', 'suppressed' and 'resolved' supplies, 'pending'
+            entries read, the 'recipients', the digest 'body' (None if nothing to
+            send) and the send 'error' (None unless the email failed)
+    """
+    now = timezone.now()
+    recipients = alert_recipients() if recipients is None else recipients
+    with transaction.atomic():
+        pending = list(LowStockAlert.objects.filter(status='PENDING').order_by('id').values(
+            'id', 'supply_id', 'supply__name', 'supply__location', 'supply__quantity',
+            'supply__reorder_point', 'supply__low_stock'))
+        recent = set(LowStockAlert.objects.filter(
+            status='SENT', delivered_at__gte=now - timedelta(seconds=window)).values_list('supply_id', flat=True))
+
+    latest = {}
+    for entry in pending:
+        latest[entry['supply_id']] = entry
+    outcome = {}
+    for supply_id, entry in latest.items():
+        if supply_id is None or not entry['supply__low_stock']:
+            outcome[supply_id] = 'RESOLVED'
+        elif supply_id in recent:
+            outcome[supply_id] = 'SUPPRESSED'
+        else:
+            outcome[supply_id] = 'SENT'
+    send = sorted((entry for supply_id, entry in latest.items() if outcome[supply_id] == 'SENT'),
+                  key=lambda entry: entry['supply__name'])
+
+    counts = list(outcome.values())
+    result = {'pending': len(pending), 'sent': len(send), 'suppressed': counts.count('SUPPRESSED'),
+              'resolved': counts.count('RESOLVED'), 'recipients': recipients,
+              'body': digest_body(send) if send else None, 'error': None}
+    if dry_run or (send and not recipients):
+        return result
+
+    if send:
+        try:
+            send_mail(
+                f'Low stock: {len(send)} supplies need reordering',
+                result['body'],
+                settings.DEFAULT_FROM_EMAIL,
+                recipients,
+            )
+        except (SMTPException, OSError) as e:
+            logger.error('Low-stock digest not sent, %d alert(s) left pending: %s', len(pending), e)
+            result['error'] = str(e)
+            return result
+    # Older entries of a supply are settled like its latest one, except that
+    # only the latest of a sent supply is recorded as SENT
+    settled = {'SENT': [], 'SUPPRESSED': [], 'RESOLVED': []}
+    for entry in pending:
+        status = outcome[entry['supply_id']]
+        if status == 'SENT' and entry is not latest[entry['supply_id']]:
+            status = 'SUPPRESSED'
+        settled[status].append(entry['id'])
+    with transaction.atomic():
+        for status, alert_ids in settled.items():
+            settle(alert_ids, status, now)
+    return result
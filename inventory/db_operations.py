@@ -2,7 +2,7 @@
 # This module provides functions to interact with the database directly from Python code
 
 
-from django.db import connection, models
+from django.db import connection
 from .models import Supply, AuditLog
 from django.contrib.auth.models import User
 
@@ -109,7 +109,7 @@ def get_low_stock_supplies():
     Returns:
         QuerySet: Supplies with low stock
     """
-    return Supply.objects.filter(quantity__lte=models.F('reorder_point'))
+    return Supply.objects.filter(low_stock=True)
 
 def create_audit_log(user, action, supply, details):
     """
@@ -0,0 +1,274 @@
+# Bulk Export Module
+# This module streams the supply catalog out as CSV or JSON Lines in a single
+# query without materialising model instances, so export memory stays flat and
+# the first byte is sent immediately. Finished exports are kept as snapshot files
+# keyed on the catalog version, so repeat downloads skip the database entirely
+
+
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import zlib
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Aggregate, CharField, Value
+from .models import Supply
+
+# Rows fetched from the database cursor per round trip
+EXPORT_CHUNK_SIZE = 2000
+
+# The first seven columns match the bulk import layout, so an export can be re-imported
+EXPORT_HEADER = [
+    'Name', 'Category', 'Tags', 'Price', 'Quantity', 'Reorder Point', 'Location',
+    'Created At', 'Updated At',
+]
+JSONL_KEYS = (
+    'name', 'category', 'tags', 'price', 'quantity', 'reorder_point', 'location',
+    'created_at', 'updated_at',
+)
+
+# Joins tag names inside the aggregate; never appears in a tag name
+TAG_SEPARATOR = '\x1f'
+
+# Export format name: (file extension, content type, gzip-compressed)
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv', False),
+    'csv.gz': ('csv.gz', 'application/gzip', True),
+    'jsonl': ('jsonl', 'application/x-ndjson', False),
+    'jsonl.gz': ('jsonl.gz', 'application/gzip', True),
+}
+
+# Snapshots kept for the current catalog version; every filter set gets its
+# own file, so the least recently written are dropped beyond this
+MAX_SNAPSHOTS = 50
+
+SNAPSHOT_NAME = re.compile(r'^supplies-[0-9a-z]+-v(\d+)\.')
+
+
+class GroupConcat(Aggregate):
+    """
+    Concatenate the values of a group into one string (GROUP_CONCAT / STRING_AGG)
+    """
+    function = 'GROUP_CONCAT'
+    output_field = CharField()
+
+    def __init__(self, expression, separator=TAG_SEPARATOR, **extra):
+        super().__init__(expression, Value(separator), **extra)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='STRING_AGG', **extra_context)
+
+
+def iter_export_rows(queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Read export columns as plain tuples straight from a server-side cursor
+
+    Category names come from a join and tag names are aggregated per supply
+    in the database, so the whole export is one query however many tags exist.
+
+    Args:
+        queryset (QuerySet, optional): Supplies to export. Defaults to all supplies.
+        chunk_size (int, optional): Rows fetched per round trip. Defaults to EXPORT_CHUNK_SIZE.
+
+    Yields:
+        tuple: Values in JSONL_KEYS order, with tags as a sorted list
+    """
+    if queryset is None:
+        queryset = Supply.objects.all()
+    rows = (
+        queryset.order_by('name')
+        .annotate(tag_names=GroupConcat('tags__name'))
+        .values_list(
+            'name', 'category__name', 'tag_names', 'price', 'quantity',
+            'reorder_point', 'location', 'created_at', 'updated_at',
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+    for name, category, tag_names, price, quantity, reorder_point, location, created, updated in rows:
+        yield (
+            name, category or '', sorted(tag_names.split(TAG_SEPARATOR)) if tag_names else [],
+            price, quantity, reorder_point, location, created.isoformat(), updated.isoformat(),
+        )
+
+
+def stream_csv(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Encode export rows as CSV text, yielding one string per block of rows
+
+    Rows are batched so the response is sent in a few large writes rather
+    than one tiny write per row. Tags are space separated, as the importer expects.
+
+    Args:
+        rows (iterable): Rows from iter_export_rows
+        chunk_size (int, optional): Rows per yielded block. Defaults to EXPORT_CHUNK_SIZE.
+
+    Yields:
+        str: CSV text
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADER)
+    count = 0
+    for row in rows:
+        writer.writerow((row[0], row[1], ' '.join(row[2]), *row[3:]))
+        count += 1
+        if count == chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            count = 0
+    yield buffer.getvalue()
+
+
+def stream_jsonl(rows, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Encode export rows as JSON Lines, yielding one string per block of rows
+
+    Args:
+        rows (iterable): Rows from iter_export_rows
+        chunk_size (int, optional): Rows per yielded block. Defaults to EXPORT_CHUNK_SIZE.
+
+    Yields:
+        str: JSON Lines text
+    """
+    encode = json.JSONEncoder(ensure_ascii=False, default=str).encode
+    lines = []
+    for row in rows:
+        lines.append(encode(dict(zip(JSONL_KEYS, row))))
+        if len(lines) == chunk_size:
+            lines.append('')
+            yield '\n'.join(lines)
+            lines = []
+    if lines:
+        lines.append('')
+        yield '\n'.join(lines)
+
+
+def gzip_stream(chunks, level=6):
+    """
+    Encode and gzip text chunks on the fly, without buffering the whole file
+
+    Args:
+        chunks (iterable): Text chunks
+        level (int, optional): zlib compression level. Defaults to 6.
+
+    Yields:
+        bytes: gzip data
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_supplies_stream(export_format='csv', queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Stream the supply export in one of EXPORT_FORMATS
+
+    Args:
+        export_format (str, optional): Key of EXPORT_FORMATS. Defaults to 'csv'.
+        queryset (QuerySet, optional): Supplies to export. Defaults to all supplies.
+        chunk_size (int, optional): Rows fetched and encoded per block. Defaults to EXPORT_CHUNK_SIZE.
+
+    Returns:
+        iterator: Text chunks, or bytes for compressed formats
+
+    Raises:
+        ValueError: If the format is not supported
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'Unsupported export format "{export_format}"')
+    rows = iter_export_rows(queryset, chunk_size)
+    encode = stream_jsonl if export_format.startswith('jsonl') else stream_csv
+    chunks = encode(rows, chunk_size)
+    if EXPORT_FORMATS[export_format][2]:
+        return gzip_stream(chunks)
+    return chunks
+
+
+def snapshot_path(export_format, filter_query, version):
+    """
+    Path of the snapshot file for one export format, filter set and catalog version
+
+    The file name doubles as the ETag, so it changes with every catalog write.
+
+    Args:
+        export_format (str): Key of EXPORT_FORMATS
+        filter_query (str): Active filters as a query string, '' for the whole catalog
+        version (int): Catalog version the snapshot reflects
+
+    Returns:
+        Path: Snapshot location inside EXPORT_SNAPSHOT_DIR
+    """
+    key = hashlib.blake2b(filter_query.encode(), digest_size=8).hexdigest() if filter_query else 'all'
+    extension = EXPORT_FORMATS[export_format][0]
+    return Path(settings.EXPORT_SNAPSHOT_DIR) / f'supplies-{key}-v{version}.{extension}'
+
+
+def prune_snapshots(path, keep=MAX_SNAPSHOTS):
+    """
+    Delete the snapshots made for older catalog versions, of any format and
+    filters, then the oldest of the rest beyond keep
+
+    Args:
+        path (Path): Snapshot just written, which is always kept
+        keep (int, optional): Snapshots left in place. Defaults to MAX_SNAPSHOTS.
+    """
+    version = int(SNAPSHOT_NAME.match(path.name).group(1))
+    live = []
+    for snapshot in path.parent.glob('supplies-*'):
+        match = SNAPSHOT_NAME.match(snapshot.name)
+        if not match or snapshot == path:
+            continue
+        try:
+            if int(match.group(1)) < version:
+                snapshot.unlink()
+            else:
+                live.append((snapshot.stat().st_mtime, snapshot))
+        except FileNotFoundError:
+            pass
+    live.sort(reverse=True)
+    for _, snapshot in live[keep - 1:]:
+        try:
+            snapshot.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def write_snapshot(chunks, path):
+    """
+    Pass export chunks through while saving them as a snapshot file
+
+    The file is written under a temporary name and moved into place only
+    once the export is complete, so an interrupted download never leaves
+    a truncated snapshot behind.
+
+    Args:
+        chunks (iterable): Text or bytes chunks from export_supplies_stream
+        path (Path): Snapshot location from snapshot_path
+
+    Yields:
+        bytes: The chunks, encoded
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix='.', suffix='.tmp')
+    complete = False
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+                f.write(data)
+                yield data
+        os.replace(temp_path, path)
+        complete = True
+        prune_snapshots(path)
+    finally:
+        if not complete:
+            os.remove(temp_path)
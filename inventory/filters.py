@@ -0,0 +1,87 @@
+# Supply Filters Module
+# One place that turns the index page's query parameters into database filters,
+# shared by every view that lists or exports supplies
+
+
+from urllib.parse import urlencode
+
+from django.db.models import Exists, OuterRef
+from .models import Supply
+from .search import search_filter
+
+# Query parameters understood by filter_supplies, in the order they appear in links
+FILTER_PARAMS = ('category', 'tag', 'location', 'search')
+
+
+def supply_filters(params):
+    """
+    Read the supply filters from request query parameters
+
+    Non-numeric category and tag ids are ignored rather than raising.
+
+    Args:
+        params (QueryDict): Request GET parameters
+
+    Returns:
+        dict: Filter values keyed by FILTER_PARAMS; empty filters are ''
+    """
+    filters = {name: params.get(name, '').strip() for name in FILTER_PARAMS}
+    for name in ('category', 'tag'):
+        if not filters[name].isdigit():
+            filters[name] = ''
+    return filters
+
+
+def filter_supplies(queryset, filters):
+    """
+    Apply supply filters to a queryset in SQL
+
+    The tag filter is a correlated EXISTS on the through table rather than a
+    join, so it neither duplicates rows nor restricts later tag aggregation,
+    and supplies are still read in name order with one index probe each
+    instead of being collected and sorted.
+
+    Args:
+        queryset (QuerySet): Supplies to filter
+        filters (dict): Values from supply_filters
+
+    Returns:
+        QuerySet: Filtered supplies
+    """
+    if filters['category']:
+        queryset = queryset.filter(category_id=filters['category'])
+    if filters['tag']:
+        queryset = queryset.filter(Exists(Supply.tags.through.objects.filter(
+            supply_id=OuterRef('id'), tag_id=filters['tag'])))
+    if filters['location']:
+        queryset = queryset.filter(location__icontains=filters['location'])
+    if filters['search']:
+        queryset = search_filter(queryset, filters['search'])
+    return queryset
+
+
+def filter_query_string(filters):
+    """
+    Encode the active filters back into a query string for links
+
+    Returns:
+        str: e.g. 'category=3&search=bowl', or '' when no filter is set
+    """
+    return urlencode([(name, filters[name]) for name in FILTER_PARAMS if filters[name]])
+
+
+def filter_signature(filters):
+    """
+    Normalize the active filters into a key for caching their results
+
+    Full-text search matches words regardless of case and spacing, so the
+    search text is lowercased and its whitespace collapsed. The location is
+    kept as typed: it is matched with icontains, and SQLite LIKE folds only
+    ASCII case and never spacing, so two locations differing in those may
+    select different rows.
+
+    Returns:
+        str: e.g. 'category=3&search=food+bowl', or '' when no filter is set
+    """
+    normalized = dict(filters, search=' '.join(filters['search'].lower().split()))
+    return filter_query_string(normalized)
@@ -0,0 +1,184 @@
+# Stockout Forecast Module
+# Per-supply consumption rates computed from the audit log's quantity changes
+# for the whole catalog at once with NumPy, stored in the StockForecast table
+
+
+import math
+from datetime import timedelta
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from .models import AuditLog, StockForecast, Supply
+
+# Days of audit history used
+HISTORY_DAYS = 90
+
+# Under exponential smoothing, usage this many days old counts half as much as today's
+HALF_LIFE_DAYS = 14.0
+
+# Usage of supplies with less history than this is spread over this many days,
+# so one early sale does not project a stockout tomorrow
+MIN_HISTORY_DAYS = 7.0
+
+# Audit rows fetched per round trip
+FETCH_SIZE = 50000
+
+METHODS = ('ewma', 'mean')
+
+
+def load_consumption(history_days=HISTORY_DAYS):
+    """
+    Load every stock decrease of the last history_days days into arrays
+
+    Args:
+        history_days (int, optional): Days of history to read. Defaults to HISTORY_DAYS.
+
+    Returns:
+        tuple: (supply ids, ages in days, units used) as NumPy arrays
+    """
+    now = timezone.now()
+    decreases = AuditLog.objects.filter(
+        quantity_change__lt=0, supply__isnull=False,
+        timestamp__gte=now - timedelta(days=history_days),
+    )
+    if connection.vendor == 'sqlite':
+        # Ages are worked out by the database, so no datetime objects are built per row
+        age = RawSQL("julianday('now') - julianday(inventory_auditlog.timestamp)", [])
+        sql, params = decreases.annotate(age=age).values_list(
+            'supply_id', 'quantity_change', 'age').query.sql_with_params()
+        chunks = []
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                chunks.append(np.array(rows, dtype=np.float64))
+        events = np.concatenate(chunks) if chunks else np.empty((0, 3))
+        return events[:, 0].astype(np.int64), events[:, 2], -events[:, 1]
+
+    rows = list(decreases.values_list('supply_id', 'timestamp', 'quantity_change').iterator(chunk_size=FETCH_SIZE))
+    supply_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    ages = np.fromiter(((now - row[1]).total_seconds() / 86400 for row in rows), dtype=np.float64, count=len(rows))
+    used = np.fromiter((-row[2] for row in rows), dtype=np.float64, count=len(rows))
+    return supply_ids, ages, used
+
+
+def align_consumption(supply_ids, event_supply_ids, ages, used, history_days=HISTORY_DAYS):
+    """
+    Match each decrease to the position of its supply in supply_ids
+
+    Decreases of supplies deleted since are dropped, and ages are clamped to
+    [0, history_days].
+
+    Args:
+        supply_ids (ndarray): Sorted ids of the supplies
+        event_supply_ids (ndarray): Supply id of each decrease
+        ages (ndarray): Age of each decrease in days
+        used (ndarray): Units used by each decrease
+        history_days (int, optional): Length of the history read. Defaults to HISTORY_DAYS.
+
+    Returns:
+        tuple: (positions, ages, used) arrays of the kept decreases
+    """
+    positions = np.searchsorted(supply_ids, event_supply_ids)
+    known = positions < len(supply_ids)
+    known[known] = supply_ids[positions[known]] == event_supply_ids[known]
+    return positions[known], np.clip(ages[known], 0, history_days), used[known]
+
+
+def history_span(count, positions, ages, history_days=HISTORY_DAYS):
+    """
+    Days of observed history of each supply
+
+    The history of a supply runs back to its oldest decrease, clamped to
+    [MIN_HISTORY_DAYS, history_days].
+
+    Args:
+        count (int): Number of supplies
+        positions (ndarray): Supply position of each decrease, from align_consumption
+        ages (ndarray): Age of each decrease in days
+        history_days (int, optional): Length of the history read. Defaults to HISTORY_DAYS.
+
+    Returns:
+        ndarray: Days of history per supply
+    """
+    span = np.zeros(count)
+    np.maximum.at(span, positions, ages)
+    return np.clip(span, MIN_HISTORY_DAYS, history_days)
+
+
+def consumption_rates(supply_ids, event_supply_ids, ages, used, history_days=HISTORY_DAYS,
+                      method='ewma', half_life=HALF_LIFE_DAYS):
+    """
+    Compute the daily usage of every supply from its stock decreases
+
+    'mean' is the average over the observed history; 'ewma' weights each
+    decrease by 0.5 ** (age / half_life) and divides by the integral of the
+    same weights over the history, so steady usage gives the same rate as
+    'mean' while recent changes in demand show sooner. Both divide by the
+    observed history of each supply (see history_span).
+
+    Args:
+        supply_ids (ndarray): Sorted ids of the supplies to forecast
+        event_supply_ids (ndarray): Supply id of each decrease
+        ages (ndarray): Age of each decrease in days
+        used (ndarray): Units used by each decrease
+        history_days (int, optional): Length of the history read. Defaults to HISTORY_DAYS.
+        method (str, optional): 'ewma' or 'mean'. Defaults to 'ewma'.
+        half_life (float, optional): EWMA half-life in days. Defaults to HALF_LIFE_DAYS.
+
+    Returns:
+        ndarray: Units used per day, aligned with supply_ids
+    """
+    count = len(supply_ids)
+    positions, ages, used = align_consumption(supply_ids, event_supply_ids, ages, used, history_days)
+    span = history_span(count, positions, ages, history_days)
+
+    if method == 'mean':
+        return np.bincount(positions, weights=used, minlength=count) / span
+    decay = math.log(2) / half_life
+    weighted = np.bincount(positions, weights=used * np.exp(-decay * ages), minlength=count)
+    return weighted * decay / -np.expm1(-decay * span)
+
+
+def update_forecasts(history_days=HISTORY_DAYS, method='ewma', half_life=HALF_LIFE_DAYS):
+    """
+    Recompute the forecast of every supply and replace the StockForecast table
+
+    Args:
+        history_days (int, optional): Days of audit history to use. Defaults to HISTORY_DAYS.
+        method (str, optional): 'ewma' or 'mean'. Defaults to 'ewma'.
+        half_life (float, optional): EWMA half-life in days. Defaults to HALF_LIFE_DAYS.
+
+    Returns:
+        dict: Number of 'supplies', consumption 'events' read, supplies 'forecast'
+            and supplies running out 'within_week'
+    """
+    if method not in METHODS:
+        raise ValueError(f'Unknown forecast method: {method}')
+    computed_at = timezone.now()
+    with transaction.atomic():
+        stock = np.array(Supply.objects.order_by('id').values_list('id', 'quantity'), dtype=np.int64).reshape(-1, 2)
+        supply_ids, quantities = stock[:, 0], stock[:, 1]
+        event_supply_ids, ages, used = load_consumption(history_days)
+        rates = consumption_rates(supply_ids, event_supply_ids, ages, used, history_days, method, half_life)
+
+        forecast = np.flatnonzero(rates > 0)
+        StockForecast.objects.all().delete()
+        # One prepared insert for all rows: building a model instance per supply
+        # would take several times longer than the forecast itself
+        stamp = connection.ops.adapt_datetimefield_value(computed_at)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {StockForecast._meta.db_table} (supply_id, daily_usage, computed_at) VALUES (%s, %s, %s)',
+                [(supply_id, rate, stamp) for supply_id, rate in zip(supply_ids[forecast].tolist(), rates[forecast].tolist())],
+            )
+    return {
+        'supplies': len(supply_ids),
+        'events': len(used),
+        'forecast': len(forecast),
+        'within_week': int(np.count_nonzero(quantities[forecast] < rates[forecast] * 7)),
+    }
@@ -1,5 +1,6 @@
 from django import forms
 from .models import Supply, Category, Tag
+from .reference import reference_data, use_cached_choices
 
 class CategoryForm(forms.ModelForm):
     """
@@ -30,7 +31,8 @@ class SupplyForm(forms.ModelForm):
     """
     Form for creating and editing supplies.
     Fields: name, price, quantity, reorder_point, location, category, tags
-    Includes validation for numeric fields and dynamic loading of categories/tags
+    Includes validation for numeric fields; category and tag options come
+    from the reference data cache, submitted values are checked against the database
     """
     class Meta:
         model = Supply
@@ -47,13 +49,17 @@ class SupplyForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Load all categories and tags for dropdowns
-        self.fields['category'].queryset = Category.objects.all()
-        self.fields['tags'].queryset = Tag.objects.all()
+        # List categories and tags from the cache; the fields' default
+        # querysets (all rows) still validate what is submitted
+        reference = reference_data()
+        use_cached_choices(self.fields['category'], reference.categories)
+        use_cached_choices(self.fields['tags'], reference.tags)
 
 class UploadFileForm(forms.Form):
     """
     Form for uploading CSV files to import supplies.
-    Fields: file (CSV file)
+    Fields: file (CSV file), only_changes and dry_run (bulk import options)
     """
-    file = forms.FileField(label='Select a CSV file to upload')
\ No newline at end of file
+    file = forms.FileField(label='Select a CSV file to upload')
+    only_changes = forms.BooleanField(required=False, label='Only write supplies that changed')
+    dry_run = forms.BooleanField(required=False, label='Dry run (report changes without saving)')
\ No newline at end of file
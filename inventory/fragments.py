@@ -0,0 +1,92 @@
+# Fragment Cache Module
+# Rendered rows of the supply table, cached under keys that change whenever
+# what a row shows would change, so a page only renders the rows that did
+
+
+import hashlib
+import threading
+
+from django.core.cache import caches
+from django.template.loader import render_to_string
+
+ROW_TEMPLATE = 'inventory/includes/supply_row.html'
+
+
+class RowCacheStats:
+    """
+    Hit and miss counters of this process's row cache, for tuning its size
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 3) if total else None,
+            }
+
+    def reset(self):
+        with self.lock:
+            self.hits = self.misses = 0
+
+
+row_cache_stats = RowCacheStats()
+
+
+def row_cache_key(supply, role, reference_version):
+    """
+    Build the cache key of one rendered supply row
+
+    Saving a supply (including bulk imports and receipts) moves its updated_at;
+    its tag ids cover link changes made without a save; the reference data
+    version covers renamed categories and tags; the role covers the edit and
+    delete buttons; the forecast usage rate covers the days left column.
+
+    Args:
+        supply (Supply): Supply with category and forecast selected and tags prefetched
+        role (str): 'editor' or 'viewer'
+        reference_version (int): Current categories and tags version
+
+    Returns:
+        str: Cache key
+    """
+    tag_ids = ','.join(sorted(str(tag.id) for tag in supply.tags.all()))
+    tags = hashlib.blake2b(tag_ids.encode('ascii'), digest_size=8).hexdigest()
+    forecast = getattr(supply, 'forecast', None)
+    usage = forecast.daily_usage if forecast is not None else ''
+    return f'supply-row:{supply.id}:{supply.updated_at.timestamp()}:{tags}:{usage}:{reference_version}:{role}'
+
+
+def render_supply_row(supply, user, role, reference_version):
+    """
+    Return a supply's table row, rendering it only on a cache miss
+
+    Args:
+        supply (Supply): Supply with category and forecast selected and tags prefetched
+        user (User): Viewer, for the row template's permission checks
+        role (str): 'editor' or 'viewer', matching what the permission checks decide
+        reference_version (int): Current categories and tags version
+
+    Returns:
+        str: Row HTML
+    """
+    cache = caches['fragments']
+    key = row_cache_key(supply, role, reference_version)
+    html = cache.get(key)
+    row_cache_stats.record(html is not None)
+    if html is None:
+        html = render_to_string(ROW_TEMPLATE, {'supply': supply, 'user': user})
+        cache.set(key, html)
+    return html
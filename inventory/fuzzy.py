@@ -0,0 +1,264 @@
+# Fuzzy Search Module
+# An in-process trigram index of supply names for typo-tolerant matching
+# ("catt littr" finds "Cat Litter"), answered from memory without a query per keystroke
+
+
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db.models import Max
+from .models import Supply
+from .versions import CATALOG, get_version
+
+# Minimum share of the query's trigrams a name must contain to be a match
+MIN_SCORE = 0.45
+
+# Seconds between checks for writes made by other processes
+REFRESH_INTERVAL = 5.0
+
+# Changes are re-read from slightly before the last sync, since a transaction
+# can commit rows stamped earlier than rows another one committed first
+SYNC_LOOKBACK = timedelta(seconds=30)
+
+# Rebuild the postings once this share of their entries belongs to removed names
+COMPACT_RATIO = 0.25
+
+NON_WORD_RE = re.compile(r'[^\w]+')
+
+
+def normalize(text):
+    """
+    Lowercase, strip accents and collapse punctuation to single spaces
+    """
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return NON_WORD_RE.sub(' ', text).strip()
+
+
+def trigrams(text):
+    """
+    Return the set of word trigrams of a text, padded like PostgreSQL's pg_trgm
+
+    Each word is padded with two spaces in front and one behind, so short
+    words and word starts still produce trigrams ('cat' -> '  c', ' ca', 'cat', 'at ').
+    """
+    grams = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class TrigramIndex:
+    """
+    In-memory trigram index of supply names.
+
+    Postings are plain lists of ids. Removing or renaming a supply leaves its
+    old entries in place: removed ids are skipped on lookup and renamed ones
+    are re-checked against their current name, until enough accumulate to
+    rebuild the postings.
+
+    Attributes:
+        names (dict): Supply id to current name
+        keys (dict): Supply id to its padded words, for trigram membership tests
+        sizes (dict): Supply id to number of trigrams in its name
+        postings (dict): Trigram to list of supply ids
+        renamed (set): Ids whose postings still hold entries for an old name
+        stale (int): Posting entries left behind by removed or renamed supplies
+    """
+    def __init__(self):
+        self.names = {}
+        self.keys = {}
+        self.sizes = {}
+        self.postings = defaultdict(list)
+        self.renamed = set()
+        self.entries = 0
+        self.stale = 0
+
+    def add(self, supply_id, name):
+        # Most saves leave the name alone (stock edits, receipts); re-adding
+        # those would only leave stale postings behind
+        if self.names.get(supply_id) == name:
+            return
+        if supply_id in self.names:
+            self.remove(supply_id)
+            self.renamed.add(supply_id)
+        grams = trigrams(name)
+        self.names[supply_id] = name
+        # '  cat   litter ': a query trigram is a substring exactly when the name has it
+        self.keys[supply_id] = ''.join(f'  {word} ' for word in normalize(name).split())
+        self.sizes[supply_id] = len(grams)
+        for gram in grams:
+            self.postings[gram].append(supply_id)
+        self.entries += len(grams)
+
+    def remove(self, supply_id):
+        if self.names.pop(supply_id, None) is None:
+            return
+        del self.keys[supply_id]
+        self.stale += self.sizes.pop(supply_id)
+        if self.stale > self.entries * COMPACT_RATIO:
+            self.compact()
+
+    def compact(self):
+        names = self.names
+        self.__init__()
+        for supply_id, name in names.items():
+            self.add(supply_id, name)
+
+    def search(self, query, limit=10, min_score=MIN_SCORE):
+        """
+        Rank names by the share of the query's trigrams they contain
+
+        A name sharing at least `needed` of the query's q trigrams must contain
+        one of its q - needed + 1 rarest, so only those postings are counted;
+        the frequent trigrams are then tested on the candidates alone, best
+        counts first, stopping once no remaining candidate can rank.
+
+        Args:
+            query (str): Text typed by the user
+            limit (int, optional): Maximum number of matches. Defaults to 10.
+            min_score (float, optional): Minimum share of query trigrams matched. Defaults to MIN_SCORE.
+
+        Returns:
+            list: (supply id, name, score) tuples, best first
+        """
+        grams = trigrams(query)
+        if not grams:
+            return []
+        needed = max(1, math.ceil(min_score * len(grams)))
+        ordered = sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))
+        rare, frequent = ordered[:len(grams) - needed + 1], ordered[len(grams) - needed + 1:]
+        counts = Counter()
+        for gram in rare:
+            counts.update(self.postings.get(gram, ()))
+
+        # Min-heap of the best `limit` matches so far, worst on top
+        best = []
+        cutoff = needed
+        for supply_id, shared in counts.most_common():
+            if shared + len(frequent) < cutoff:
+                break
+            key = self.keys.get(supply_id)
+            if key is None:
+                continue
+            if supply_id in self.renamed:
+                shared = sum(gram in key for gram in rare)
+            shared += sum(gram in key for gram in frequent)
+            if shared < cutoff:
+                continue
+            # Containment first, then similarity so tighter names rank higher
+            match = (shared, shared / (len(grams) + self.sizes[supply_id] - shared), supply_id)
+            if len(best) < limit:
+                heapq.heappush(best, match)
+            elif match > best[0]:
+                heapq.heapreplace(best, match)
+            if len(best) == limit:
+                cutoff = max(cutoff, best[0][0])
+        ranked = sorted(best, key=lambda match: (-match[0], -match[1], self.names[match[2]]))
+        return [(supply_id, self.names[supply_id], round(shared / len(grams), 3)) for shared, _, supply_id in ranked]
+
+
+class SupplyNameIndex:
+    """
+    Process-wide trigram index of supply names, kept in step with the database.
+
+    It is loaded on first use. Supply signals update it immediately in this
+    process; writes from other processes (web workers, the import worker)
+    are picked up by checking the catalog version at most every
+    REFRESH_INTERVAL seconds and reading only the supplies changed since.
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.index = None
+        self.version = None
+        self.synced_at = None
+        self.checked = 0.0
+
+    def load(self):
+        index = TrigramIndex()
+        version = get_version(CATALOG)
+        synced_at = Supply.objects.aggregate(latest=Max('updated_at'))['latest']
+        for supply_id, name in Supply.objects.values_list('id', 'name').iterator(chunk_size=5000):
+            index.add(supply_id, name)
+        self.index, self.version, self.synced_at = index, version, synced_at
+        self.checked = time.monotonic()
+
+    def refresh(self):
+        """
+        Apply writes made by other processes since the last check
+        """
+        self.checked = time.monotonic()
+        version = get_version(CATALOG)
+        if version == self.version:
+            return
+        changed = Supply.objects.all()
+        if self.synced_at is not None:
+            changed = changed.filter(updated_at__gte=self.synced_at - SYNC_LOOKBACK)
+        latest = self.synced_at
+        for supply_id, name, updated_at in changed.values_list('id', 'name', 'updated_at'):
+            if self.index.names.get(supply_id) != name:
+                self.index.add(supply_id, name)
+            latest = updated_at if latest is None else max(latest, updated_at)
+        self.synced_at = latest
+        self.version = version
+        # Deletions leave no updated_at trace; reload if the counts disagree
+        if Supply.objects.count() != len(self.index.names):
+            self.load()
+
+    def current(self):
+        with self.lock:
+            if self.index is None:
+                self.load()
+            elif time.monotonic() - self.checked >= REFRESH_INTERVAL:
+                self.refresh()
+            return self.index
+
+    def search(self, query, limit=10):
+        index = self.current()
+        with self.lock:
+            return index.search(query, limit)
+
+    def supply_saved(self, supply):
+        with self.lock:
+            if self.index is not None:
+                self.index.add(supply.id, supply.name)
+
+    def supply_deleted(self, supply_id):
+        with self.lock:
+            if self.index is not None:
+                self.index.remove(supply_id)
+
+    def reset(self):
+        with self.lock:
+            self.index = None
+
+
+supply_names = SupplyNameIndex()
+
+
+def fuzzy_supply_ids(text, queryset=None, limit=10):
+    """
+    Return the ids of supplies whose names closely match a possibly misspelled query
+
+    Args:
+        text (str): Search box contents
+        queryset (QuerySet, optional): Only keep supplies in this queryset (other filters)
+        limit (int, optional): Maximum number of ids. Defaults to 10.
+
+    Returns:
+        list: Supply ids, closest match first
+    """
+    # Look further when other filters may drop some of the matches
+    matches = supply_names.search(text, limit if queryset is None else limit * 5)
+    ids = [supply_id for supply_id, _, _ in matches]
+    if queryset is not None and ids:
+        allowed = set(queryset.filter(id__in=ids).values_list('id', flat=True))
+        ids = [supply_id for supply_id in ids if supply_id in allowed]
+    return ids[:limit]
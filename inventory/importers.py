@@ -0,0 +1,1048 @@
+# Bulk Import Module
+# This module streams supply CSV files into the database in fixed-size chunks,
+# resolving categories, tags and supplies with a constant number of queries per chunk
+
+
+import codecs
+import csv
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Supply, Category, Tag, AuditLog, ImportJob, ImportCheckpoint, low_stock_flag
+from .search import reindex_supplies, search_triggers_paused
+from .versions import CATALOG, REFERENCE, bump_version
+
+# Number of CSV rows written per chunk
+CHUNK_SIZE = 1000
+
+# Expected bulk CSV columns: Name, Category, Tags, Price, Quantity, Reorder Point, Location
+BULK_COLUMN_COUNT = 7
+
+# Bytes read from the start of an upload to detect its format
+SNIFF_BYTES = 4096
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# Rows before the first data row of each format, used to number rows in error reports
+HEADER_ROWS = {'csv': 1, 'jsonl': 0}
+
+# Target size of a byte-range shard for parallel parsing
+SHARD_BYTES = 8 * 1024 * 1024
+
+# Files smaller than this are parsed in-process even when workers are available
+PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+
+CENT = Decimal('0.01')
+
+# Supply.price is DecimalField(max_digits=10, decimal_places=2)
+MAX_PRICE = Decimal('1e8')
+
+SUPPLY_UPDATE_FIELDS = ['category', 'price', 'quantity', 'reorder_point', 'location', 'updated_at', 'low_stock']
+
+
+class ImportResult:
+    """
+    Summary of a bulk import run.
+
+    Attributes:
+        rows (int): Number of valid rows read
+        created (int): Number of supplies inserted
+        updated (int): Number of existing supplies overwritten
+        unchanged (int): Number of rows skipped because nothing changed
+        error_count (int): Number of rows rejected by validation, including those
+            a resumed import's earlier run rejected before its checkpoint
+        chunks (int): Number of chunks written
+        resumed_row (int): Data row number a resumed import continued after, 0 if not resumed
+    """
+    def __init__(self):
+        self.error_count = 0
+        self.resumed_row = 0
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.chunks = 0
+
+    @property
+    def total(self):
+        return self.created + self.updated
+
+
+class RowError(ValueError):
+    """
+    A bulk import row that cannot be imported.
+
+    Attributes:
+        column (str): Label of the offending column, empty for whole-row problems
+        reason (str): Human readable explanation
+    """
+    def __init__(self, column, reason):
+        super().__init__(f'{column}: {reason}' if column else reason)
+        self.column = column
+        self.reason = reason
+
+
+def parse_text(max_length, required=False):
+    """
+    Build a parser for a stripped text column with the model's length limit
+    """
+    def parse(value):
+        value = value.strip()
+        if required and not value:
+            raise ValueError('is required')
+        if len(value) > max_length:
+            raise ValueError(f'is longer than {max_length} characters')
+        return value
+    return parse
+
+
+def parse_tags(value):
+    tags = value.split()
+    for tag in tags:
+        if len(tag) > 50:
+            raise ValueError(f'tag "{tag[:20]}..." is longer than 50 characters')
+    return tags
+
+
+def parse_price(value):
+    try:
+        price = Decimal(value.replace('$', '').strip())
+    except InvalidOperation:
+        raise ValueError(f'"{value}" is not a number')
+    if not price.is_finite() or price < 0:
+        raise ValueError(f'"{value}" must be zero or positive')
+    if price >= MAX_PRICE:
+        raise ValueError(f'"{value}" is too large')
+    return price
+
+
+def parse_count(value):
+    try:
+        count = int(value)
+    except ValueError:
+        raise ValueError(f'"{value}" is not a whole number')
+    if count < 0:
+        raise ValueError(f'"{value}" must be zero or positive')
+    return count
+
+
+# Per-column parsers in bulk CSV order: (record key, column label, parser)
+COLUMNS = (
+    ('name', 'Name', parse_text(100, required=True)),
+    ('category', 'Category', parse_text(100)),
+    ('tags', 'Tags', parse_tags),
+    ('price', 'Price', parse_price),
+    ('quantity', 'Quantity', parse_count),
+    ('reorder_point', 'Reorder Point', parse_count),
+    ('location', 'Location', parse_text(100)),
+)
+
+
+def parse_supply_row(row):
+    """
+    Convert a raw bulk CSV row into a supply record
+
+    Valid rows take a single inline pass; only when that fails are the
+    columns re-run through their COLUMNS parsers to name the offending column.
+    The try blocks cost nothing on Python 3.11+ unless a value is invalid.
+
+    Args:
+        row (list): Columns in bulk CSV order
+
+    Returns:
+        dict: Parsed record, or None for a blank row
+
+    Raises:
+        RowError: If the row is too short or a column is invalid
+    """
+    if len(row) < BULK_COLUMN_COUNT:
+        if not any(value.strip() for value in row):
+            return None
+        raise RowError('', f'expected {BULK_COLUMN_COUNT} columns, got {len(row)}')
+    try:
+        name, category, tags, price, quantity, reorder_point, location = row[:BULK_COLUMN_COUNT]
+        name, category, location = name.strip(), category.strip(), location.strip()
+        short_tags = len(tags) <= 50
+        tags = tags.split()
+        price = Decimal(price.replace('$', '').strip())
+        quantity, reorder_point = int(quantity), int(reorder_point)
+        # Comparing NaN raises InvalidOperation, infinities fail the range check
+        if (name and len(name) <= 100 and len(category) <= 100 and len(location) <= 100
+                and (short_tags or max(map(len, tags)) <= 50)
+                and 0 <= price < MAX_PRICE
+                and quantity >= 0 and reorder_point >= 0):
+            return {
+                'name': name, 'category': category, 'tags': tags, 'price': price,
+                'quantity': quantity, 'reorder_point': reorder_point, 'location': location,
+            }
+    except (ValueError, InvalidOperation):
+        pass
+    record = {}
+    for (key, label, parse), value in zip(COLUMNS, row):
+        try:
+            record[key] = parse(value)
+        except ValueError as e:
+            raise RowError(label, str(e)) from None
+    return record
+
+
+class ErrorReport:
+    """
+    Streams rejected rows to a CSV file as they are found.
+
+    A file that already holds a report, from an earlier attempt at the same
+    import, is appended to; see resume.
+
+    Attributes:
+        count (int): Number of rows written to the report
+        appending (bool): Whether the file held an earlier report when opened
+    """
+    HEADER = ['Row', 'Column', 'Reason', 'Raw Line']
+
+    def __init__(self, text_file):
+        self.file = text_file
+        self.writer = csv.writer(text_file)
+        self.count = 0
+        text_file.seek(0, os.SEEK_END)
+        self.appending = text_file.tell() > 0
+        if not self.appending:
+            self.writer.writerow(self.HEADER)
+
+    def add(self, row_number, column, reason, raw_line):
+        self.writer.writerow([row_number, column, reason, raw_line.rstrip('\r\n')])
+        self.count += 1
+
+    def resume(self, last_row):
+        """
+        Keep the rows an earlier attempt reported up to last_row and drop the rest
+
+        Rows after last_row are read again by the resumed import and would
+        otherwise be reported twice.
+
+        Args:
+            last_row (int): Last report row number covered by the import's checkpoint
+
+        Returns:
+            int: Number of rows kept, which count is set to
+        """
+        if not self.appending:
+            return self.count
+        self.file.seek(0)
+        rows = list(csv.reader(self.file))[1:]
+        kept = [row for row in rows if int(row[0]) <= last_row]
+        if len(kept) < len(rows):
+            self.file.seek(0)
+            self.file.truncate()
+            self.writer.writerow(self.HEADER)
+            self.writer.writerows(kept)
+        self.file.seek(0, os.SEEK_END)
+        self.count = len(kept)
+        return self.count
+
+
+def iter_chunks(iterable, size=CHUNK_SIZE):
+    """
+    Split an iterable into lists of at most size items without materializing it
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def resolve_names(model, names):
+    """
+    Map names to primary keys for a model with a unique name, creating missing rows
+
+    Args:
+        model: Category or Tag
+        names (set): Names to resolve
+
+    Returns:
+        dict: name -> id
+    """
+    if not names:
+        return {}
+    ids = dict(model.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names - ids.keys()
+    if missing:
+        model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+        # bulk_create sends no signals; let cached dropdowns pick up the new rows
+        bump_version(REFERENCE)
+        ids.update(model.objects.filter(name__in=missing).values_list('name', 'id'))
+    return ids
+
+
+def record_fingerprint(price, quantity, reorder_point, location, category, tags):
+    """
+    Digest the importable fields of a supply so unchanged rows can be skipped
+
+    Args:
+        price (Decimal): Price of the supply
+        quantity (int): Quantity in stock
+        reorder_point (int): Minimum quantity before reorder
+        location (str): Storage location
+        category (str): Category name, empty or None if unset
+        tags (iterable): Tag names, order and duplicates are ignored
+
+    Returns:
+        bytes: 16-byte fingerprint
+    """
+    key = '\x1f'.join([
+        str(Decimal(price).quantize(CENT)),
+        str(quantity),
+        str(reorder_point),
+        location,
+        category or '',
+        '\x1e'.join(sorted(set(tags))),
+    ])
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+
+def load_fingerprints(names):
+    """
+    Bulk-load the fingerprints of existing supplies in two queries
+
+    Args:
+        names (iterable): Supply names to look up
+
+    Returns:
+        dict: name -> (id, fingerprint) for supplies that exist
+    """
+    rows = list(Supply.objects.filter(name__in=names).values_list(
+        'id', 'name', 'price', 'quantity', 'reorder_point', 'location', 'category__name'
+    ))
+    tags = defaultdict(list)
+    links = Supply.tags.through.objects.filter(supply_id__in=[row[0] for row in rows])
+    for supply_id, tag_name in links.values_list('supply_id', 'tag__name'):
+        tags[supply_id].append(tag_name)
+    return {
+        name: (supply_id, record_fingerprint(price, quantity, reorder_point, location, category, tags[supply_id]))
+        for supply_id, name, price, quantity, reorder_point, location, category in rows
+    }
+
+
+def write_chunk(records, only_changes=False, dry_run=False):
+    """
+    Upsert one chunk of parsed records and replace their tag links
+
+    Rows with the same name inside a chunk are collapsed, the last one wins,
+    matching the sequential get_or_create behaviour of the old importer.
+    With only_changes, rows whose fingerprint matches the stored supply are
+    left untouched, so their updated_at and tag links do not change.
+
+    Args:
+        records (list): Parsed records from parse_supply_row
+        only_changes (bool, optional): Skip rows identical to the database. Defaults to False.
+        dry_run (bool, optional): Classify rows without writing anything. Defaults to False.
+
+    Returns:
+        tuple: (created, updated, unchanged) counts
+    """
+    by_name = {record['name']: record for record in records}
+    if only_changes or dry_run:
+        existing = load_fingerprints(by_name.keys())
+    else:
+        existing = {
+            name: (supply_id, None)
+            for name, supply_id in Supply.objects.filter(name__in=by_name.keys()).values_list('name', 'id')
+        }
+
+    added = []
+    changed = []
+    unchanged = 0
+    for name, record in by_name.items():
+        if name not in existing:
+            added.append(record)
+            continue
+        supply_id, fingerprint = existing[name]
+        if fingerprint is not None and fingerprint == record_fingerprint(
+            record['price'], record['quantity'], record['reorder_point'],
+            record['location'], record['category'], record['tags'],
+        ):
+            unchanged += 1
+        else:
+            changed.append((supply_id, record))
+    if dry_run:
+        return len(added), len(changed), unchanged
+
+    written = added + [record for _, record in changed]
+    category_ids = resolve_names(Category, {r['category'] for r in written if r['category']})
+    tag_ids = resolve_names(Tag, {tag for r in written for tag in r['tags']})
+    now = timezone.now()
+
+    def build(record, supply_id=None):
+        return Supply(
+            id=supply_id,
+            name=record['name'],
+            category_id=category_ids.get(record['category']),
+            price=record['price'],
+            quantity=record['quantity'],
+            reorder_point=record['reorder_point'],
+            location=record['location'],
+            updated_at=now,
+            low_stock=record['quantity'] <= record['reorder_point'],
+        )
+
+    # Index the chunk in one pass instead of once per row and tag link
+    with search_triggers_paused():
+        if added:
+            Supply.objects.bulk_create([build(record) for record in added])
+        if changed:
+            Supply.objects.bulk_update([build(record, supply_id) for supply_id, record in changed],
+                                       SUPPLY_UPDATE_FIELDS)
+
+        supply_ids = {record['name']: supply_id for supply_id, record in changed}
+        if added:
+            supply_ids.update(Supply.objects.filter(name__in=[r['name'] for r in added]).values_list('name', 'id'))
+        Through = Supply.tags.through
+        if changed:
+            Through.objects.filter(supply_id__in=[supply_id for supply_id, _ in changed]).delete()
+        Through.objects.bulk_create([
+            Through(supply_id=supply_ids[record['name']], tag_id=tag_ids[tag])
+            for record in written
+            for tag in set(record['tags'])
+        ])
+        reindex_supplies(list(supply_ids.values()))
+    if written:
+        # Bulk writes bypass the model signals that keep the catalog version current
+        bump_version(CATALOG)
+    return len(added), len(changed), unchanged
+
+
+def import_supply_rows(rows, chunk_size=CHUNK_SIZE, progress=None, only_changes=False, dry_run=False,
+                       error_report=None):
+    """
+    Parse and import raw bulk CSV rows, one transaction per chunk
+
+    Invalid rows are skipped and counted; the rest of the file is still imported.
+
+    Args:
+        rows (iterable): Raw CSV rows without the header
+        chunk_size (int, optional): Rows per chunk. Defaults to CHUNK_SIZE.
+        progress (callable, optional): Called with the running ImportResult after each chunk
+        only_changes (bool, optional): Write only inserted and changed rows. Defaults to False.
+        dry_run (bool, optional): Report the diff without writing. Defaults to False.
+        error_report (ErrorReport, optional): Receives every rejected row
+
+    Returns:
+        ImportResult: Counts of created, updated, unchanged and rejected supplies
+    """
+    result = ImportResult()
+    numbered = ((row_number, row, None, None) for row_number, row in enumerate(rows, 1))
+    records = collect_records(numbered, on_error=rejected_row_handler(result, error_report, HEADER_ROWS['csv']))
+    return write_records(records, chunk_size, progress, only_changes, dry_run, result=result)
+
+
+def rejected_row_handler(result, error_report=None, header_rows=0):
+    """
+    Build the on_error callback that counts rejected rows and writes them to a report
+
+    Args:
+        result (ImportResult): Receives the error count
+        error_report (ErrorReport, optional): Receives every rejected row
+        header_rows (int, optional): Rows before the first data row, so reported
+            row numbers match what a spreadsheet shows. Defaults to 0.
+    """
+    def reject(row_number, column, reason, raw_line):
+        result.error_count += 1
+        if error_report is not None:
+            error_report.add(row_number + header_rows, column, reason, raw_line)
+    return reject
+
+
+def write_records(records, chunk_size=CHUNK_SIZE, progress=None, only_changes=False, dry_run=False,
+                  checkpoint=None, result=None):
+    """
+    Write already parsed records in chunks, one transaction per chunk
+
+    When a checkpoint is given, the byte offset and row number of the last record
+    of each chunk are saved inside the chunk's transaction, so the checkpoint never
+    points past data that was rolled back.
+
+    Args:
+        records (iterable): Parsed records from parse_supply_row
+        chunk_size (int, optional): Rows per chunk. Defaults to CHUNK_SIZE.
+        progress (callable, optional): Called with the running ImportResult after each chunk
+        only_changes (bool, optional): Write only inserted and changed rows. Defaults to False.
+        dry_run (bool, optional): Report the diff without writing. Defaults to False.
+        checkpoint (ImportCheckpoint, optional): Checkpoint advanced after every chunk
+        result (ImportResult, optional): Result to accumulate into. Defaults to a new one.
+
+    Returns:
+        ImportResult: Counts of created, updated and unchanged supplies
+    """
+    result = result or ImportResult()
+    for chunk in iter_chunks(records, chunk_size):
+        with transaction.atomic():
+            created, updated, unchanged = write_chunk(chunk, only_changes, dry_run)
+            if checkpoint is not None:
+                checkpoint.byte_offset = chunk[-1]['offset']
+                checkpoint.row_number = chunk[-1]['row']
+                checkpoint.save(update_fields=['byte_offset', 'row_number', 'updated_at'])
+        result.rows += len(chunk)
+        result.created += created
+        result.updated += updated
+        result.unchanged += unchanged
+        result.chunks += 1
+        if progress:
+            progress(result)
+    return result
+
+
+def import_supplies_csv(text_file, chunk_size=CHUNK_SIZE, progress=None, only_changes=False, dry_run=False,
+                        error_report=None):
+    """
+    Stream a bulk CSV file (with header row) into the database
+
+    Args:
+        text_file: File-like object opened in text mode
+        chunk_size (int, optional): Rows per chunk. Defaults to CHUNK_SIZE.
+        progress (callable, optional): Called with the running ImportResult after each chunk
+        only_changes (bool, optional): Write only inserted and changed rows. Defaults to False.
+        dry_run (bool, optional): Report the diff without writing. Defaults to False.
+        error_report (ErrorReport, optional): Receives every rejected row
+
+    Returns:
+        ImportResult: Counts of created, updated, unchanged and rejected supplies
+    """
+    reader = csv.reader(text_file)
+    next(reader, None)  # Skip header
+    return import_supply_rows(reader, chunk_size, progress, only_changes, dry_run, error_report)
+
+
+def import_supply_receipts(supply, text_file, user, chunk_size=CHUNK_SIZE):
+    """
+    Add the quantities of a receipt CSV to one supply in a constant number of queries per chunk
+
+    Rows (header row, then rows whose second column is a quantity) are streamed
+    in chunks; each chunk's IMPORT audit entries are written with one bulk_create
+    and the summed stock change is applied at the end as a single F() update.
+    Everything runs in one transaction, so an invalid row leaves no trace.
+
+    Args:
+        supply (Supply): Supply receiving the stock
+        text_file: File-like object opened in text mode
+        user (User): User performing the import
+        chunk_size (int, optional): Audit entries per bulk insert. Defaults to CHUNK_SIZE.
+
+    Returns:
+        tuple: (number of rows imported, total quantity added)
+
+    Raises:
+        ValueError: If a quantity is not an integer
+    """
+    reader = csv.reader(text_file)
+    next(reader, None)  # Skip header
+    quantities = (int(row[1]) for row in reader if len(row) >= 2)
+    rows = 0
+    total = 0
+    with transaction.atomic():
+        for chunk in iter_chunks(quantities, chunk_size):
+            AuditLog.objects.bulk_create([
+                AuditLog(
+                    supply=supply,
+                    supply_name=supply.name,
+                    action='IMPORT',
+                    user=user,
+                    details=f"Imported {quantity} units of {supply.name}",
+                    quantity_change=quantity,
+                )
+                for quantity in chunk
+            ])
+            rows += len(chunk)
+            total += sum(chunk)
+        Supply.objects.filter(id=supply.id).update(
+            quantity=F('quantity') + total,
+            low_stock=low_stock_flag(F('quantity') + total),
+            updated_at=timezone.now(),
+        )
+        bump_version(CATALOG)
+    return rows, total
+
+
+def file_sha256(path):
+    """
+    Hash a file in fixed-size blocks
+
+    Returns:
+        str: Hex SHA-256 digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def detect_format(stream):
+    """
+    Identify a bulk import file from its first bytes rather than its name
+
+    Gzip is recognised by its magic number; the (decompressed) content is JSON
+    Lines when it starts with an object and CSV otherwise.
+
+    Args:
+        stream: Binary file object at its start; it is rewound afterwards
+
+    Returns:
+        tuple: (compressed, kind) where kind is 'csv' or 'jsonl'
+
+    Raises:
+        ValueError: If the content is not UTF-8 text, plain or gzip-compressed
+    """
+    head = stream.read(SNIFF_BYTES)
+    stream.seek(0)
+    compressed = head.startswith(GZIP_MAGIC)
+    try:
+        if compressed:
+            with gzip.GzipFile(fileobj=stream) as gz:
+                head = gz.read(SNIFF_BYTES)
+            stream.seek(0)
+        head = head.removeprefix(codecs.BOM_UTF8)
+        codecs.getincrementaldecoder('utf-8')().decode(head)
+    except (OSError, EOFError, UnicodeDecodeError):
+        raise ValueError('Unsupported file format: expected CSV or JSON Lines, optionally gzip-compressed')
+    kind = 'jsonl' if head.lstrip().startswith(b'{') else 'csv'
+    return compressed, kind
+
+
+def open_import_file(path, compressed):
+    """
+    Open a bulk import file for binary reading, decompressing gzip on the fly
+
+    Offsets of a compressed file refer to the decompressed stream; seeking
+    forward decompresses and discards, it never unpacks the file to disk.
+    """
+    return gzip.open(path, 'rb') if compressed else open(path, 'rb')
+
+
+def header_end(path, compressed=False, kind='csv'):
+    """
+    Return the byte offset of the first data row of a bulk import file
+
+    CSV files start with a header row; JSON Lines files have none.
+    """
+    if kind == 'jsonl':
+        return 0
+    with open_import_file(path, compressed) as f:
+        f.readline()
+        return f.tell()
+
+
+def jsonl_row(line):
+    """
+    Convert one JSON Lines object into a row in bulk CSV column order
+
+    Expected keys: name, category, tags (list or space separated string),
+    price, quantity, reorder_point, location.
+
+    Raises:
+        RowError: If the line is not a JSON object
+    """
+    try:
+        obj = json.loads(line.lstrip('\ufeff'))
+    except ValueError as e:
+        raise RowError('', f'invalid JSON: {e}') from None
+    if not isinstance(obj, dict):
+        raise RowError('', 'expected a JSON object')
+    def field(key):
+        value = obj.get(key)
+        return '' if value is None else str(value)
+
+    tags = obj.get('tags') or ''
+    if isinstance(tags, list):
+        tags = ' '.join(str(tag) for tag in tags)
+    return [
+        field('name'), field('category'), tags, field('price'),
+        field('quantity'), field('reorder_point'), field('location'),
+    ]
+
+
+def iter_rows(raw, start, end=None, kind='csv'):
+    """
+    Read CSV or JSON Lines records from a binary file between two byte offsets
+
+    Lines are pulled lazily by the parser, so after each record the running
+    position is exactly the byte offset where the next record starts. A
+    record containing bytes that are not valid UTF-8 is decoded with
+    replacement characters and yielded as a RowError in place of its row,
+    so it is rejected like any other invalid row.
+
+    Args:
+        raw: Binary file object
+        start (int): Byte offset of the first record
+        end (int, optional): Stop once this offset is reached. Defaults to end of file.
+        kind (str, optional): 'csv' or 'jsonl'. Defaults to 'csv'.
+
+    Yields:
+        tuple: (CSV row, JSON line or RowError, offset after the record, raw lines of the record)
+    """
+    raw.seek(start)
+    position = start
+    record_lines = []
+    invalid = False
+
+    def lines():
+        nonlocal position, invalid
+        for line in raw:
+            position += len(line)
+            try:
+                text = line.decode('utf-8')
+            except UnicodeDecodeError:
+                text = line.decode('utf-8', errors='replace')
+                invalid = True
+            record_lines.append(text)
+            yield text
+            if end is not None and position >= end:
+                return
+
+    for row in (lines() if kind == 'jsonl' else csv.reader(lines())):
+        if invalid:
+            row = RowError('', 'not valid UTF-8')
+            invalid = False
+        yield row, position, record_lines
+        record_lines = []
+
+
+def parse_record(row, kind='csv'):
+    """
+    Parse a CSV row or a JSON line into a supply record
+
+    Returns:
+        dict: Parsed record, or None for a blank row
+
+    Raises:
+        RowError: If the row cannot be imported
+    """
+    if isinstance(row, RowError):
+        raise row
+    if kind == 'jsonl':
+        if not row.strip():
+            return None
+        row = jsonl_row(row)
+    return parse_supply_row(row)
+
+
+def collect_records(numbered_rows, kind='csv', on_error=None):
+    """
+    Turn raw rows into records, reporting invalid rows instead of stopping
+
+    Args:
+        numbered_rows (iterable): (data row number, row, end offset, raw lines) tuples
+        kind (str, optional): 'csv' or 'jsonl'. Defaults to 'csv'.
+        on_error (callable, optional): Called with (row number, column, reason, raw line)
+            for every rejected row
+
+    Yields:
+        dict: Parsed records with their 'row' number and end 'offset'
+    """
+    for row_number, row, offset, lines in numbered_rows:
+        try:
+            record = parse_record(row, kind)
+        except RowError as e:
+            if on_error is not None:
+                raw_line = ''.join(lines) if lines else ','.join(row)
+                on_error(row_number, e.column, e.reason, raw_line)
+            continue
+        if record is not None:
+            record['row'] = row_number
+            record['offset'] = offset
+            yield record
+
+
+def iter_file_records(path, start, first_row=1, compressed=False, kind='csv', on_error=None):
+    """
+    Parse a bulk import file sequentially from a byte offset
+
+    Args:
+        path (str): Path of the file
+        start (int): Byte offset of the first data row to read
+        first_row (int, optional): Data row number of that row. Defaults to 1.
+        compressed (bool, optional): Whether the file is gzip-compressed. Defaults to False.
+        kind (str, optional): 'csv' or 'jsonl'. Defaults to 'csv'.
+        on_error (callable, optional): Called for every rejected row, see collect_records
+
+    Yields:
+        dict: Parsed records with their 'row' number and end 'offset'
+    """
+    with open_import_file(path, compressed) as raw:
+        numbered = (
+            (row_number, row, offset, lines)
+            for row_number, (row, offset, lines) in enumerate(iter_rows(raw, start, kind=kind), first_row)
+        )
+        yield from collect_records(numbered, kind, on_error)
+
+
+def shard_file(path, workers, shard_bytes=SHARD_BYTES, start=None):
+    """
+    Split an uncompressed bulk import file into newline-aligned byte ranges
+
+    Shards are cut at line boundaries, so sharded parsing assumes one record
+    per line (no quoted newlines), which holds for the bulk import formats.
+
+    Args:
+        path (str): Path of the file
+        workers (int): Number of parser processes
+        shard_bytes (int, optional): Target shard size. Defaults to SHARD_BYTES.
+        start (int, optional): Offset of the first data row. Defaults to just after a CSV header.
+
+    Returns:
+        list: (start, end) byte offsets in file order
+    """
+    size = os.path.getsize(path)
+    if start is None:
+        start = header_end(path)
+    with open(path, 'rb') as f:
+        count = max(workers, (size - start) // shard_bytes + 1)
+        step = max(1, (size - start) // count)
+        bounds = [start]
+        for i in range(1, count):
+            f.seek(start + i * step)
+            f.readline()
+            position = min(f.tell(), size)
+            if position > bounds[-1]:
+                bounds.append(position)
+        if bounds[-1] < size:
+            bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+RECORD_FIELDS = ('name', 'category', 'tags', 'price', 'quantity', 'reorder_point', 'location', 'row', 'offset')
+
+
+def parse_shard(path, start, end, kind='csv'):
+    """
+    Parse and validate one byte range of a bulk import file in a worker process
+
+    Records are returned as flat tuples with the price as a string, which pickle
+    several times faster than dicts of Decimals on the way back to the parent.
+    Row numbers are relative to the shard; the parent rebases them.
+
+    Args:
+        path (str): Path of the file
+        start (int): First byte of the shard (start of a line)
+        end (int): Byte after the last line of the shard
+        kind (str, optional): 'csv' or 'jsonl'. Defaults to 'csv'.
+
+    Returns:
+        tuple: (records as tuples in RECORD_FIELDS order,
+                rejected rows as (row, column, reason, raw line) tuples,
+                number of rows read)
+    """
+    records = []
+    errors = []
+    row_count = 0
+    with open(path, 'rb') as raw:
+        def rows():
+            nonlocal row_count
+            for row_count, (row, offset, lines) in enumerate(iter_rows(raw, start, end, kind), 1):
+                yield row_count, row, offset, lines
+
+        for r in collect_records(rows(), kind, lambda *error: errors.append(error)):
+            records.append((
+                r['name'], r['category'], tuple(r['tags']), str(r['price']),
+                r['quantity'], r['reorder_point'], r['location'], r['row'], r['offset'],
+            ))
+    return records, errors, row_count
+
+
+def parse_file_parallel(path, workers, start=None, first_row=1, kind='csv', on_error=None, shard_bytes=SHARD_BYTES):
+    """
+    Parse an uncompressed bulk import file with a process pool, yielding records in file order
+
+    Shards are parsed concurrently while the caller consumes earlier shards,
+    so the write phase stays single-threaded and ordered. At most `workers`
+    shards are in flight: the next one is submitted as each result is consumed,
+    so parsed rows never pile up ahead of a slower writer.
+
+    Args:
+        path (str): Path of the file
+        workers (int): Number of parser processes
+        start (int, optional): Offset of the first data row. Defaults to just after a CSV header.
+        first_row (int, optional): Data row number of that row. Defaults to 1.
+        kind (str, optional): 'csv' or 'jsonl'. Defaults to 'csv'.
+        on_error (callable, optional): Called for every rejected row, see collect_records
+        shard_bytes (int, optional): Target shard size. Defaults to SHARD_BYTES.
+
+    Yields:
+        dict: Parsed records with their 'row' number and end 'offset'
+    """
+    shards = iter(shard_file(path, workers, shard_bytes, start=start))
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    base = first_row - 1
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque(pool.submit(parse_shard, path, shard_start, shard_end, kind)
+                        for shard_start, shard_end in islice(shards, workers))
+        while pending:
+            records, errors, row_count = pending.popleft().result()
+            for shard_start, shard_end in islice(shards, 1):
+                pending.append(pool.submit(parse_shard, path, shard_start, shard_end, kind))
+            if on_error is not None:
+                for row_number, column, reason, raw_line in errors:
+                    on_error(row_number + base, column, reason, raw_line)
+            for values in records:
+                record = dict(zip(RECORD_FIELDS, values))
+                record['price'] = Decimal(record['price'])
+                record['row'] += base
+                yield record
+            base += row_count
+
+
+def import_supplies_file(path, workers=1, chunk_size=CHUNK_SIZE, progress=None, only_changes=False, dry_run=False,
+                         resume=True, file_hash=None, error_report=None):
+    """
+    Import a bulk file from disk: CSV or JSON Lines, optionally gzip-compressed
+
+    Every chunk commits together with an ImportCheckpoint keyed on the file's
+    SHA-256, so re-running the same file after a crash continues after the last
+    committed chunk. A file whose previous run completed is imported from the start.
+    Large uncompressed files are parsed in parallel. Invalid rows are skipped,
+    counted and written to the error report; the rest of the file is still imported.
+
+    Args:
+        path (str): Path of the file
+        workers (int, optional): Parser processes for large files. Defaults to 1.
+        chunk_size (int, optional): Rows per chunk. Defaults to CHUNK_SIZE.
+        progress (callable, optional): Called with the running ImportResult after each chunk
+        only_changes (bool, optional): Write only inserted and changed rows. Defaults to False.
+        dry_run (bool, optional): Report the diff without writing. Defaults to False.
+        resume (bool, optional): Continue from an unfinished checkpoint. Defaults to True.
+        file_hash (str, optional): SHA-256 computed at upload time. Defaults to hashing the file.
+        error_report (ErrorReport, optional): Receives every rejected row
+
+    Returns:
+        ImportResult: Counts of created, updated, unchanged and rejected supplies
+
+    Raises:
+        ValueError: If the file format is not supported
+    """
+    with open(path, 'rb') as f:
+        compressed, kind = detect_format(f)
+    checkpoint = None
+    start = header_end(path, compressed, kind)
+    first_row = 1
+    result = ImportResult()
+    if not dry_run:
+        checkpoint, created = ImportCheckpoint.objects.get_or_create(
+            file_hash=file_hash or file_sha256(path),
+            defaults={'file_name': os.path.basename(path)},
+        )
+        if resume and not created and not checkpoint.completed and checkpoint.byte_offset > start:
+            start = checkpoint.byte_offset
+            result.resumed_row = checkpoint.row_number
+            first_row = checkpoint.row_number + 1
+        else:
+            checkpoint.byte_offset = start
+            checkpoint.row_number = 0
+            checkpoint.completed = False
+            checkpoint.save()
+
+    if error_report is not None:
+        # Rows rejected before the checkpoint were reported by the interrupted run
+        result.error_count = error_report.resume(first_row - 1 + HEADER_ROWS[kind])
+    reject = rejected_row_handler(result, error_report, HEADER_ROWS[kind])
+    if workers > 1 and not compressed and os.path.getsize(path) - start >= PARALLEL_MIN_BYTES:
+        records = parse_file_parallel(path, workers, start, first_row, kind, reject)
+    else:
+        records = iter_file_records(path, start, first_row, compressed, kind, reject)
+    write_records(records, chunk_size, progress, only_changes, dry_run, checkpoint, result)
+
+    if checkpoint is not None:
+        checkpoint.completed = True
+        checkpoint.save(update_fields=['completed', 'updated_at'])
+    return result
+
+
+def claim_next_job():
+    """
+    Atomically move the oldest queued import job to RUNNING
+
+    The status check is part of the UPDATE, so two workers can never claim the same job.
+
+    Returns:
+        ImportJob: The claimed job or None if the queue is empty
+    """
+    for job_id in ImportJob.objects.filter(status='QUEUED').order_by('created_at').values_list('id', flat=True)[:10]:
+        claimed = ImportJob.objects.filter(id=job_id, status='QUEUED').update(
+            status='RUNNING', started_at=timezone.now()
+        )
+        if claimed:
+            return ImportJob.objects.get(id=job_id)
+    return None
+
+
+def run_import_job(job, workers=1):
+    """
+    Import the file attached to a claimed job, recording progress after every chunk
+
+    Rejected rows are streamed to a CSV error report stored on the job;
+    the report is discarded when every row was valid. A requeued job that
+    resumes from its checkpoint appends to the report of its earlier attempt,
+    so the report and error_count cover the whole file. The uploaded file is
+    deleted once the job is DONE or FAILED; an interrupted import resumes
+    from its checkpoint only while the job is still RUNNING.
+
+    Args:
+        job (ImportJob): Job in RUNNING state
+        workers (int, optional): Parser processes for large files. Defaults to 1.
+
+    Returns:
+        ImportJob: The job with its final status
+    """
+    def report(result):
+        ImportJob.objects.filter(id=job.id).update(
+            rows_done=result.rows,
+            created_count=result.created,
+            updated_count=result.updated,
+            unchanged_count=result.unchanged,
+            error_count=result.error_count,
+            resumed_from_row=result.resumed_row,
+        )
+
+    report_name = f'import_errors/import_{job.id}_errors.csv'
+    report_path = job.error_report.storage.path(report_name)
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    with open(report_path, 'a+', newline='', encoding='utf-8') as report_file:
+        error_report = ErrorReport(report_file)
+        try:
+            result = import_supplies_file(
+                job.file.path, workers, progress=report, only_changes=job.only_changes, dry_run=job.dry_run,
+                file_hash=job.file_hash or None, error_report=error_report,
+            )
+            job.rows_done = result.rows
+            job.created_count = result.created
+            job.updated_count = result.updated
+            job.unchanged_count = result.unchanged
+            job.error_count = result.error_count
+            job.resumed_from_row = result.resumed_row
+            job.status = 'DONE'
+        except Exception as e:
+            job.refresh_from_db(fields=[
+                'rows_done', 'created_count', 'updated_count', 'unchanged_count', 'error_count', 'resumed_from_row',
+            ])
+            job.errors = str(e)
+            job.status = 'FAILED'
+
+    if error_report.count:
+        job.error_report.name = report_name
+    else:
+        os.remove(report_path)
+    # Terminal state: the upload is no longer needed (resuming a re-upload goes by its hash)
+    job.file.delete(save=False)
+    job.finished_at = timezone.now()
+    job.save()
+    return job
@@ -0,0 +1,42 @@
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from inventory.importers import parse_file_parallel, parse_shard, shard_file
+
+class Command(BaseCommand):
+    help = 'Measures bulk CSV parsing throughput for different worker counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500000, help='Rows in the generated CSV file')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                            help='Worker counts to compare')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            path = f.name
+            f.write('Name,Category,Tags,Price,Quantity,Reorder Point,Location\n')
+            for i in range(rows):
+                f.write(f'Benchmark Supply {i},Category {i % 25},Dog Cat Tag{i % 50},${i % 500}.99,{i % 300},{i % 20},R{i % 40}\n')
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        self.stdout.write(f'Generated {rows} rows ({size_mb:.1f} MB)')
+
+        try:
+            baseline = None
+            for workers in options['workers']:
+                started = time.perf_counter()
+                if workers == 1:
+                    parsed = sum(len(parse_shard(path, start, end)[0]) for start, end in shard_file(path, 1))
+                else:
+                    parsed = sum(1 for _ in parse_file_parallel(path, workers))
+                elapsed = time.perf_counter() - started
+                rate = parsed / elapsed
+                baseline = baseline or rate
+                self.stdout.write(
+                    f'{workers:>3} workers: {parsed} rows in {elapsed:.2f}s '
+                    f'({rate:,.0f} rows/s, {rate / baseline:.2f}x)'
+                )
+        finally:
+            os.remove(path)
@@ -0,0 +1,42 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from inventory.importers import claim_next_job, run_import_job
+from inventory.models import ImportJob
+
+class Command(BaseCommand):
+    help = 'Processes queued bulk import jobs outside the web process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Parser processes used for large files')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--requeue-running', action='store_true',
+                            help='Requeue jobs left RUNNING by a crashed worker (single worker only)')
+
+    def handle(self, *args, **options):
+        if options['requeue_running']:
+            requeued = ImportJob.objects.filter(status='RUNNING').update(status='QUEUED')
+            if requeued:
+                self.stdout.write(f'Requeued {requeued} interrupted import(s); they resume from their checkpoints.')
+
+        self.stdout.write('Waiting for import jobs...')
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write(f'Processing import #{job.pk} ({job.original_name})...')
+            job = run_import_job(job, options['workers'])
+            if job.status == 'DONE':
+                self.stdout.write(self.style.SUCCESS(
+                    f'Import #{job.pk} finished: {job.rows_done} rows at {job.rows_per_second} rows/s'
+                    + (f' (resumed after row {job.resumed_from_row})' if job.resumed_from_row else '')
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f'Import #{job.pk} failed: {job.errors}'))
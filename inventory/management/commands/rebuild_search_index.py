@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from inventory.search import fts_enabled, rebuild_search_index
+
+class Command(BaseCommand):
+    help = 'Recreates the full-text search documents of every supply'
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            self.stdout.write('Full-text search index is only available on SQLite; nothing to do')
+            return
+        with transaction.atomic():
+            count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} supplies'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+from inventory.models import Supply, low_stock_flag
+
+# Rows whose stored flag disagrees with their stock
+WRONG_FLAG = Q(low_stock=True, quantity__gt=F('reorder_point')) | Q(low_stock=False, quantity__lte=F('reorder_point'))
+
+class Command(BaseCommand):
+    help = 'Re-verifies the low_stock flag of every supply and repairs wrong ones in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Supplies checked per statement')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many flags are wrong')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = wrong = 0
+        last_id = 0
+        while True:
+            # Walk the table by id range so each statement is short and commits on its own
+            ids = list(Supply.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            batch = Supply.objects.filter(id__gte=ids[0], id__lte=ids[-1]).filter(WRONG_FLAG)
+            if options['dry_run']:
+                wrong += batch.count()
+            else:
+                wrong += batch.update(low_stock=low_stock_flag())
+            checked += len(ids)
+            last_id = ids[-1]
+
+        verb = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} supplies. {verb} {wrong} wrong low-stock flag(s).'))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from inventory.alerts import ALERT_WINDOW, deliver_alerts
+
+class Command(BaseCommand):
+    help = 'Sends pending low-stock alerts as batched email digests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Send one digest and exit')
+        parser.add_argument('--interval', type=float, default=300.0, help='Seconds between digests')
+        parser.add_argument('--window', type=int, default=ALERT_WINDOW,
+                            help='Seconds before a supply that was alerted can be alerted again')
+        parser.add_argument('--dry-run', action='store_true', help='Print the digest without sending it')
+
+    def handle(self, *args, **options):
+        while True:
+            result = deliver_alerts(window=options['window'], dry_run=options['dry_run'])
+            self.report(result, options['dry_run'])
+            if options['once'] or options['dry_run']:
+                break
+            time.sleep(options['interval'])
+
+    def report(self, result, dry_run):
+        if not result['pending']:
+            return
+        if result['sent'] and not result['recipients']:
+            self.stdout.write(self.style.WARNING(
+                f"{result['sent']} low-stock alert(s) waiting: set LOW_STOCK_ALERT_RECIPIENTS "
+                'or give an editor an email address'))
+            return
+        if result['error']:
+            self.stderr.write(self.style.ERROR(
+                f"Digest not sent, {result['pending']} alert(s) left pending for the next run: {result['error']}"))
+            return
+        if dry_run and result['body']:
+            self.stdout.write(result['body'])
+        verb = 'Would send' if dry_run else 'Sent'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['sent']} alert(s) to {len(result['recipients'])} recipient(s); "
+            f"{result['suppressed']} repeated within the window, {result['resolved']} already restocked."))
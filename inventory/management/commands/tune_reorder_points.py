@@ -0,0 +1,59 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from inventory.forecast import HISTORY_DAYS
+from inventory.models import Supply
+from inventory.reorder import (LEAD_TIME_DAYS, MIN_CHANGE, SERVICE_LEVEL, UPDATE_BATCH,
+                               apply_reorder_points, projected_alert_volume, recommend_reorder_points)
+
+class Command(BaseCommand):
+    help = 'Recommends reorder points from demand history and lead time, and applies them with --apply'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lead-time', type=float, default=LEAD_TIME_DAYS, help='Days from order to delivery')
+        parser.add_argument('--service-level', type=float, default=SERVICE_LEVEL,
+                            help='Share of lead times that should not run out (0-1)')
+        parser.add_argument('--history-days', type=int, default=HISTORY_DAYS, help='Days of audit history to use')
+        parser.add_argument('--min-change', type=float, default=MIN_CHANGE,
+                            help='Smallest relative change to a reorder point worth applying')
+        parser.add_argument('--report', help='Write the accepted changes to this CSV file')
+        parser.add_argument('--apply', action='store_true', help='Write the accepted reorder points')
+        parser.add_argument('--batch-size', type=int, default=UPDATE_BATCH, help='Supplies written per statement')
+
+    def handle(self, *args, **options):
+        if not 0 < options['service_level'] < 1:
+            raise CommandError('--service-level must be between 0 and 1')
+        if options['lead_time'] <= 0 or options['history_days'] <= 0:
+            raise CommandError('--lead-time and --history-days must be positive')
+
+        recommendation = recommend_reorder_points(
+            options['lead_time'], options['service_level'], options['history_days'], options['min_change'])
+        accepted = recommendation['accepted']
+        current, recommended = recommendation['current'][accepted], recommendation['recommended'][accepted]
+        raised = int((recommended > current).sum())
+        self.stdout.write(
+            f"{len(accepted)} of {len(recommendation['ids'])} reorder points would change: "
+            f"{raised} raised, {len(accepted) - raised} lowered.")
+        volume = projected_alert_volume(recommendation)
+        self.stdout.write(
+            f"Low-stock list: {volume['low_now']} supplies now, {volume['low_after']} after "
+            f"({volume['enter']} would enter and alert, {volume['leave']} would leave).")
+
+        if options['report']:
+            self.write_report(options['report'], recommendation)
+            self.stdout.write(f"Wrote the changes to {options['report']}.")
+        if options['apply']:
+            updated = apply_reorder_points(recommendation, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Updated {updated} reorder points.'))
+
+    def write_report(self, path, recommendation):
+        accepted = recommendation['accepted']
+        names = dict(Supply.objects.values_list('id', 'name').iterator(chunk_size=5000))
+        columns = [recommendation[key][accepted].tolist() for key in ('ids', 'quantities', 'current', 'recommended')]
+        demand = [recommendation[key][accepted].round(3).tolist() for key in ('mean', 'std')]
+        with open(path, 'w', newline='', encoding='utf-8') as report:
+            writer = csv.writer(report)
+            writer.writerow(['Supply ID', 'Name', 'Quantity', 'Reorder Point', 'Recommended',
+                             'Daily Demand', 'Daily Demand Std'])
+            for supply_id, quantity, current, recommended, mean, std in zip(*columns, *demand):
+                writer.writerow([supply_id, names.get(supply_id, ''), quantity, current, recommended, mean, std])
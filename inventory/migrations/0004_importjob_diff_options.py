@@ -0,0 +1,28 @@
+# Generated by Django 4.2.20 on 2026-10-18 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='dry_run',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='only_changes',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='unchanged_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
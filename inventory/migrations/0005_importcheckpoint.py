@@ -0,0 +1,30 @@
+# Generated by Django 4.2.20 on 2026-10-18 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_importjob_diff_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_hash', models.CharField(max_length=64, unique=True)),
+                ('file_name', models.CharField(blank=True, max_length=255)),
+                ('byte_offset', models.BigIntegerField(default=0)),
+                ('row_number', models.IntegerField(default=0)),
+                ('completed', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='resumed_from_row',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.20 on 2026-10-18 19:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='file_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-18 19:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_importjob_file_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='error_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='error_report',
+            field=models.FileField(blank=True, upload_to='import_errors/'),
+        ),
+    ]
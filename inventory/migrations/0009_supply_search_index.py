@@ -0,0 +1,110 @@
+# Full-text search index for supplies (SQLite FTS5)
+#
+# inventory_supply_fts holds one document per supply (rowid = supply id) with its
+# name, category name, tag names and location. Triggers keep it current for every
+# write path, including bulk writes that bypass model signals. While a row exists in
+# inventory_supply_fts_pause (only ever inside a bulk write transaction) the triggers
+# are skipped and the writer reindexes its supplies in one statement instead.
+
+from django.db import migrations
+from ._sqlite import run_sqlite
+
+# Rebuilds the search documents of the supplies matched by a WHERE clause on s.
+# Copied from inventory.search.DOCUMENT_SQL when this migration was written and
+# frozen here, so the triggers it creates do not change if that module does
+DOCUMENT_SQL = '''
+    INSERT INTO inventory_supply_fts(rowid, name, category, tags, location)
+    SELECT s.id, s.name, COALESCE(c.name, ''),
+           COALESCE((SELECT group_concat(t.name, ' ')
+                     FROM inventory_supply_tags st JOIN inventory_tag t ON t.id = st.tag_id
+                     WHERE st.supply_id = s.id), ''),
+           s.location
+    FROM inventory_supply s LEFT JOIN inventory_category c ON c.id = s.category_id
+    WHERE {where};
+'''
+
+
+def refresh(where, ids):
+    return f'DELETE FROM inventory_supply_fts WHERE rowid IN ({ids});' + DOCUMENT_SQL.format(where=where)
+
+
+FORWARD_SQL = [
+    '''
+    CREATE VIRTUAL TABLE inventory_supply_fts USING fts5(
+        name, category, tags, location,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3 4'
+    )
+    ''',
+    DOCUMENT_SQL.format(where='1'),
+    'CREATE TABLE inventory_supply_fts_pause (id INTEGER PRIMARY KEY)',
+    f'''
+    CREATE TRIGGER inventory_supply_fts_insert AFTER INSERT ON inventory_supply
+    WHEN NOT EXISTS (SELECT 1 FROM inventory_supply_fts_pause) BEGIN
+        {DOCUMENT_SQL.format(where='s.id = NEW.id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER inventory_supply_fts_update AFTER UPDATE OF name, location, category_id ON inventory_supply
+    WHEN NOT EXISTS (SELECT 1 FROM inventory_supply_fts_pause) BEGIN
+        DELETE FROM inventory_supply_fts WHERE rowid = OLD.id;
+        {DOCUMENT_SQL.format(where='s.id = NEW.id')}
+    END
+    ''',
+    '''
+    CREATE TRIGGER inventory_supply_fts_delete AFTER DELETE ON inventory_supply
+    WHEN NOT EXISTS (SELECT 1 FROM inventory_supply_fts_pause) BEGIN
+        DELETE FROM inventory_supply_fts WHERE rowid = OLD.id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER inventory_supply_fts_tag_link AFTER INSERT ON inventory_supply_tags
+    WHEN NOT EXISTS (SELECT 1 FROM inventory_supply_fts_pause) BEGIN
+        {refresh('s.id = NEW.supply_id', 'NEW.supply_id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER inventory_supply_fts_tag_unlink AFTER DELETE ON inventory_supply_tags
+    WHEN NOT EXISTS (SELECT 1 FROM inventory_supply_fts_pause) BEGIN
+        {refresh('s.id = OLD.supply_id', 'OLD.supply_id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER inventory_supply_fts_category AFTER UPDATE OF name ON inventory_category
+    WHEN NOT EXISTS (SELECT 1 FROM inventory_supply_fts_pause) BEGIN
+        {refresh('s.category_id = NEW.id', 'SELECT id FROM inventory_supply WHERE category_id = NEW.id')}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER inventory_supply_fts_tag AFTER UPDATE OF name ON inventory_tag
+    WHEN NOT EXISTS (SELECT 1 FROM inventory_supply_fts_pause) BEGIN
+        {refresh(
+            's.id IN (SELECT supply_id FROM inventory_supply_tags WHERE tag_id = NEW.id)',
+            'SELECT supply_id FROM inventory_supply_tags WHERE tag_id = NEW.id',
+        )}
+    END
+    ''',
+]
+
+REVERSE_SQL = [
+    'DROP TRIGGER IF EXISTS inventory_supply_fts_insert',
+    'DROP TRIGGER IF EXISTS inventory_supply_fts_update',
+    'DROP TRIGGER IF EXISTS inventory_supply_fts_delete',
+    'DROP TRIGGER IF EXISTS inventory_supply_fts_tag_link',
+    'DROP TRIGGER IF EXISTS inventory_supply_fts_tag_unlink',
+    'DROP TRIGGER IF EXISTS inventory_supply_fts_category',
+    'DROP TRIGGER IF EXISTS inventory_supply_fts_tag',
+    'DROP TABLE IF EXISTS inventory_supply_fts_pause',
+    'DROP TABLE IF EXISTS inventory_supply_fts',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_dataversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(FORWARD_SQL), run_sqlite(REVERSE_SQL)),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.20 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_supply_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['-timestamp'], name='auditlog_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['action', '-timestamp'], name='auditlog_action_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['user', '-timestamp'], name='auditlog_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supply',
+            index=models.Index(fields=['category', 'name'], name='supply_category_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supply',
+            index=models.Index(fields=['name', 'location'], name='supply_name_location_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='supply',
+            index=models.Index(condition=models.Q(('quantity__lte', models.F('reorder_point'))), fields=['name'], name='supply_low_stock_idx'),
+        ),
+    ]
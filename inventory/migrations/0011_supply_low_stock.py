@@ -0,0 +1,70 @@
+# Denormalized low-stock flag for supplies
+#
+# The column is added with plain ALTER TABLE: letting Django add a NOT NULL
+# column on SQLite rebuilds the table, which would drop the search triggers of
+# 0009. On SQLite, triggers then correct the flag after any insert or update
+# that leaves it wrong, so raw SQL and F() updates cannot make it drift.
+
+from django.db import migrations, models
+from ._sqlite import run_sqlite
+
+TRIGGER_SQL = [
+    '''
+    CREATE TRIGGER inventory_supply_low_stock_insert AFTER INSERT ON inventory_supply
+    WHEN NEW.low_stock IS NOT (NEW.quantity <= NEW.reorder_point) BEGIN
+        UPDATE inventory_supply SET low_stock = (NEW.quantity <= NEW.reorder_point) WHERE id = NEW.id;
+    END
+    ''',
+    '''
+    CREATE TRIGGER inventory_supply_low_stock_update AFTER UPDATE OF quantity, reorder_point, low_stock ON inventory_supply
+    WHEN NEW.low_stock IS NOT (NEW.quantity <= NEW.reorder_point) BEGIN
+        UPDATE inventory_supply SET low_stock = (NEW.quantity <= NEW.reorder_point) WHERE id = NEW.id;
+    END
+    ''',
+]
+
+DROP_TRIGGER_SQL = [
+    'DROP TRIGGER IF EXISTS inventory_supply_low_stock_insert',
+    'DROP TRIGGER IF EXISTS inventory_supply_low_stock_update',
+]
+
+
+def set_flags(apps, schema_editor):
+    Supply = apps.get_model('inventory', 'Supply')
+    Supply.objects.update(low_stock=models.ExpressionWrapper(
+        models.Q(quantity__lte=models.F('reorder_point')), output_field=models.BooleanField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_query_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='supply',
+                    name='low_stock',
+                    field=models.BooleanField(default=False, editable=False),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    'ALTER TABLE inventory_supply ADD COLUMN low_stock boolean NOT NULL DEFAULT false',
+                    'ALTER TABLE inventory_supply DROP COLUMN low_stock',
+                ),
+            ],
+        ),
+        migrations.RunPython(set_flags, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='supply',
+            name='supply_low_stock_idx',
+        ),
+        migrations.AddIndex(
+            model_name='supply',
+            index=models.Index(condition=models.Q(('low_stock', True)), fields=['name'], name='supply_low_stock_idx'),
+        ),
+        migrations.RunPython(run_sqlite(TRIGGER_SQL), run_sqlite(DROP_TRIGGER_SQL)),
+    ]
@@ -0,0 +1,67 @@
+# Low-stock alert outbox
+#
+# On SQLite, triggers enqueue an alert whenever a supply's low_stock flag turns
+# on, including when the flag triggers of 0011 correct it after a raw or F()
+# update, so crossings are caught at write time on every write path. Repeats
+# and flapping are left for the sender to collapse (see inventory.alerts).
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+from ._sqlite import run_sqlite
+
+# Same text format Django writes for datetimes on SQLite (UTC)
+NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+ENQUEUE_SQL = f'''
+        INSERT INTO inventory_lowstockalert (supply_id, supply_name, quantity, reorder_point, status, created_at)
+        VALUES (NEW.id, NEW.name, NEW.quantity, NEW.reorder_point, 'PENDING', {NOW_SQL});
+'''
+
+TRIGGER_SQL = [
+    f'''
+    CREATE TRIGGER inventory_lowstockalert_insert AFTER INSERT ON inventory_supply
+    WHEN NEW.low_stock AND NEW.quantity <= NEW.reorder_point BEGIN
+        {ENQUEUE_SQL}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER inventory_lowstockalert_update AFTER UPDATE OF low_stock ON inventory_supply
+    WHEN NEW.low_stock AND NOT OLD.low_stock AND NEW.quantity <= NEW.reorder_point BEGIN
+        {ENQUEUE_SQL}
+    END
+    ''',
+]
+
+DROP_TRIGGER_SQL = [
+    'DROP TRIGGER IF EXISTS inventory_lowstockalert_insert',
+    'DROP TRIGGER IF EXISTS inventory_lowstockalert_update',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_supply_low_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LowStockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('supply_name', models.CharField(max_length=100)),
+                ('quantity', models.IntegerField()),
+                ('reorder_point', models.IntegerField()),
+                ('status', models.CharField(choices=[('PENDING', 'PENDING'), ('SENT', 'SENT'), ('SUPPRESSED', 'SUPPRESSED'), ('RESOLVED', 'RESOLVED')], default='PENDING', max_length=10)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('delivered_at', models.DateTimeField(blank=True, null=True)),
+                ('supply', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='low_stock_alerts', to='inventory.supply')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(condition=models.Q(('status', 'PENDING')), fields=['id'], name='lowstockalert_pending_idx'), models.Index(fields=['status', 'delivered_at'], name='lowstockalert_delivered_idx')],
+            },
+        ),
+        migrations.RunPython(run_sqlite(TRIGGER_SQL), run_sqlite(DROP_TRIGGER_SQL)),
+    ]
@@ -0,0 +1,64 @@
+# Stock forecasts and structured quantity changes in the audit log
+#
+# Existing receipt and edit entries only record their quantities in the
+# details text; they are parsed once here so the forecast has history to use.
+
+import re
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+IMPORTED_RE = re.compile(r'^Imported (-?\d+) units of ')
+UPDATED_RE = re.compile(r'^Updated supply: From .*, [\d.]+, (-?\d+), .* to .*, [\d.]+, (-?\d+), .*$', re.S)
+
+
+def quantity_change(details):
+    match = IMPORTED_RE.match(details)
+    if match:
+        return int(match.group(1))
+    match = UPDATED_RE.match(details)
+    if match:
+        return int(match.group(2)) - int(match.group(1))
+    return None
+
+
+def backfill_changes(apps, schema_editor):
+    AuditLog = apps.get_model('inventory', 'AuditLog')
+    entries = AuditLog.objects.filter(action__in=['IMPORT', 'UPDATE']).only('id', 'details')
+    batch = []
+    for entry in entries.iterator(chunk_size=5000):
+        entry.quantity_change = quantity_change(entry.details)
+        if entry.quantity_change is not None:
+            batch.append(entry)
+        if len(batch) == 1000:
+            AuditLog.objects.bulk_update(batch, ['quantity_change'])
+            batch = []
+    AuditLog.objects.bulk_update(batch, ['quantity_change'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_low_stock_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockForecast',
+            fields=[
+                ('supply', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='inventory.supply')),
+                ('daily_usage', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='quantity_change',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(condition=models.Q(('quantity_change__lt', 0)), fields=['timestamp', 'supply', 'quantity_change'], name='auditlog_usage_idx'),
+        ),
+        migrations.RunPython(backfill_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Helpers shared by the inventory migrations
+#
+# The leading underscore keeps the migration loader from treating this module
+# as a migration. Applied migrations import it, so its behavior must not change.
+
+
+def run_sqlite(statements):
+    """
+    Build a RunPython function that executes raw SQL statements on SQLite only
+
+    Triggers and the FTS5 index are SQLite features; on other databases the
+    operation does nothing and the application falls back to plain queries.
+
+    Args:
+        statements (list): SQL statements, run in order
+
+    Returns:
+        function: Operation for migrations.RunPython
+    """
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement, params=None)
+    return operation
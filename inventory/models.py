@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User  # To link to the user making the change
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 
 class Category(models.Model):
     """
@@ -55,6 +56,8 @@ class Supply(models.Model):
         tags (Tag): Many-to-many relationship with Tag model
         created_at (datetime): Timestamp when the supply was created
         updated_at (datetime): Timestamp when the supply was last updated
+        low_stock (bool): Stored quantity <= reorder_point, kept current by save(),
+            the bulk import paths and (on SQLite) database triggers
     """
     name = models.CharField(max_length=100, unique=True)
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
@@ -65,10 +68,19 @@ class Supply(models.Model):
     tags = models.ManyToManyField(Tag, blank=True, related_name='supplies')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    low_stock = models.BooleanField(default=False, editable=False)
 
     class Meta:
         verbose_name_plural = "Supplies"
         ordering = ['name']
+        indexes = [
+            # Category filter, read in (name, id) keyset order
+            models.Index(fields=['category', 'name'], name='supply_category_name_idx'),
+            # Location filter: substring matches are checked in the index, in name order
+            models.Index(fields=['name', 'location'], name='supply_name_location_idx'),
+            # Low stock list: holds only the flagged rows, in name order
+            models.Index(fields=['name'], condition=models.Q(low_stock=True), name='supply_low_stock_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -83,6 +95,64 @@ class Supply(models.Model):
         """
         return self.quantity <= self.reorder_point
 
+    @property
+    def days_until_stockout(self):
+        """
+        Property that projects when the current stock runs out at the forecast usage rate.
+        
+        Select 'forecast' with the supplies to avoid a query per supply.
+        
+        Returns:
+            float: Days of stock left, or None if there is no forecast usage
+        """
+        forecast = getattr(self, 'forecast', None)
+        if forecast is None or forecast.daily_usage <= 0:
+            return None
+        return self.quantity / forecast.daily_usage
+
+    def save(self, *args, **kwargs):
+        """
+        Override save method to keep the low_stock flag in step with the stock fields.
+        """
+        self.low_stock = self.is_low_stock
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'quantity', 'reorder_point'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'low_stock'}
+        super().save(*args, **kwargs)
+
+
+def low_stock_flag(quantity=models.F('quantity')):
+    """
+    Expression computing the low_stock column in queryset updates
+
+    Args:
+        quantity (Expression, optional): The quantity being written, e.g.
+            F('quantity') + received. Defaults to the current quantity.
+
+    Returns:
+        ExpressionWrapper: Boolean expression for update(low_stock=...)
+    """
+    return models.ExpressionWrapper(models.Q(reorder_point__gte=quantity), output_field=models.BooleanField())
+
+class StockForecast(models.Model):
+    """
+    Model holding the forecast consumption rate of a supply.
+    
+    Rows are replaced as a whole by the forecast_stockouts command; supplies
+    without recorded consumption have no row.
+    
+    Attributes:
+        supply (Supply): The supply forecast (also the primary key)
+        daily_usage (float): Smoothed units used per day
+        computed_at (datetime): When the forecast was computed
+    """
+    supply = models.OneToOneField(Supply, on_delete=models.CASCADE, primary_key=True, related_name='forecast')
+    daily_usage = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.supply_id} - {self.daily_usage:.2f}/day"
+
 class AuditLog(models.Model):
     """
     Model for tracking all changes made to supplies in the inventory.
@@ -94,6 +164,7 @@ class AuditLog(models.Model):
         timestamp (datetime): When the action was performed
         user (User): User who performed the action
         details (str): Additional details about the action
+        quantity_change (int): Stock added (positive) or used (negative) by the action, if any
     """
     ACTION_CHOICES = (
         ('CREATE', 'CREATE'),
@@ -109,9 +180,19 @@ class AuditLog(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     details = models.TextField(blank=True)
+    quantity_change = models.IntegerField(null=True, blank=True)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Audit log page and its filters, newest first
+            models.Index(fields=['-timestamp'], name='auditlog_timestamp_idx'),
+            models.Index(fields=['action', '-timestamp'], name='auditlog_action_time_idx'),
+            models.Index(fields=['user', '-timestamp'], name='auditlog_user_time_idx'),
+            # Stock forecast: recent decreases read straight from the index
+            models.Index(fields=['timestamp', 'supply', 'quantity_change'], condition=models.Q(quantity_change__lt=0),
+                         name='auditlog_usage_idx'),
+        ]
 
     def __str__(self):
         return f"{self.action} - {self.supply_name} - {self.timestamp}"
@@ -123,3 +204,157 @@ class AuditLog(models.Model):
         if self.supply and not self.supply_name:
             self.supply_name = self.supply.name
         super().save(*args, **kwargs)
+
+class LowStockAlert(models.Model):
+    """
+    Model for an outbox entry recording that a supply fell to its reorder point.
+    
+    Entries are written by database triggers at the moment the low_stock flag
+    turns on (migration 0012), whatever wrote the supply, and are delivered
+    in batched email digests by the send_low_stock_alerts command.
+    
+    Attributes:
+        supply (Supply): Foreign key to Supply model (null if the supply was deleted)
+        supply_name (str): Name of the supply when it crossed its reorder point
+        quantity (int): Quantity that took the supply to its reorder point
+        reorder_point (int): Reorder point at the time
+        status (str): Delivery state (PENDING, SENT, SUPPRESSED, RESOLVED)
+        created_at (datetime): When the crossing happened
+        delivered_at (datetime): When the entry was sent or settled without sending
+    """
+    STATUS_CHOICES = (
+        ('PENDING', 'PENDING'),
+        ('SENT', 'SENT'),
+        ('SUPPRESSED', 'SUPPRESSED'),
+        ('RESOLVED', 'RESOLVED'),
+    )
+
+    supply = models.ForeignKey(Supply, on_delete=models.SET_NULL, null=True, related_name='low_stock_alerts')
+    supply_name = models.CharField(max_length=100)
+    quantity = models.IntegerField()
+    reorder_point = models.IntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    created_at = models.DateTimeField(default=timezone.now)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Outbox: only the undelivered entries, oldest first
+            models.Index(fields=['id'], condition=models.Q(status='PENDING'), name='lowstockalert_pending_idx'),
+            # Dedupe window: supplies alerted recently
+            models.Index(fields=['status', 'delivered_at'], name='lowstockalert_delivered_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.supply_name} - {self.quantity}/{self.reorder_point} - {self.status}"
+
+class ImportJob(models.Model):
+    """
+    Model for a bulk supply import queued from the web and processed by a worker.
+    
+    Attributes:
+        file (File): Uploaded CSV file waiting to be imported
+        original_name (str): File name as uploaded by the user
+        file_hash (str): SHA-256 of the upload, computed while it was received
+        status (str): Job state (QUEUED, RUNNING, DONE, FAILED)
+        user (User): User who uploaded the file
+        only_changes (bool): Write only rows that differ from the stored supply
+        dry_run (bool): Report the diff without writing anything
+        rows_done (int): Number of rows imported so far
+        created_count (int): Number of supplies inserted
+        updated_count (int): Number of supplies overwritten
+        unchanged_count (int): Number of rows skipped because nothing changed
+        resumed_from_row (int): Row an interrupted import of the same file continued after
+        error_count (int): Number of rows rejected by validation
+        error_report (File): CSV listing every rejected row (row, column, reason, raw line)
+        errors (str): Error that stopped the import, if any
+        created_at (datetime): When the job was queued
+        started_at (datetime): When a worker picked up the job
+        finished_at (datetime): When the job finished or failed
+    """
+    STATUS_CHOICES = (
+        ('QUEUED', 'QUEUED'),
+        ('RUNNING', 'RUNNING'),
+        ('DONE', 'DONE'),
+        ('FAILED', 'FAILED'),
+    )
+
+    file = models.FileField(upload_to='imports/')
+    original_name = models.CharField(max_length=255, blank=True)
+    file_hash = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    only_changes = models.BooleanField(default=False)
+    dry_run = models.BooleanField(default=False)
+    rows_done = models.IntegerField(default=0)
+    created_count = models.IntegerField(default=0)
+    updated_count = models.IntegerField(default=0)
+    unchanged_count = models.IntegerField(default=0)
+    resumed_from_row = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    error_report = models.FileField(upload_to='import_errors/', blank=True)
+    errors = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Import #{self.pk} - {self.original_name} - {self.status}"
+
+    @property
+    def rows_per_second(self):
+        """
+        Property that computes the import throughput of the job.
+        
+        Returns:
+            float: Rows imported per second since the job started, 0 if not started
+        """
+        if not self.started_at:
+            return 0.0
+        elapsed = ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
+        return round(self.rows_done / elapsed, 1) if elapsed > 0 else float(self.rows_done)
+
+class ImportCheckpoint(models.Model):
+    """
+    Model recording how far the import of a given file has been committed.
+    
+    Attributes:
+        file_hash (str): SHA-256 of the imported file contents
+        file_name (str): Name of the file when the checkpoint was created
+        byte_offset (int): Offset just past the last committed row
+        row_number (int): Data row number of the last committed row
+        completed (bool): Whether the whole file has been imported
+        updated_at (datetime): When the checkpoint last advanced
+    """
+    file_hash = models.CharField(max_length=64, unique=True)
+    file_name = models.CharField(max_length=255, blank=True)
+    byte_offset = models.BigIntegerField(default=0)
+    row_number = models.IntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.file_name} - row {self.row_number}{' (completed)' if self.completed else ''}"
+
+class DataVersion(models.Model):
+    """
+    Model holding a counter that changes whenever a group of tables changes.
+    
+    Caches key their entries on the counter, so any write makes them stale
+    without having to know which entries it affected.
+    
+    Attributes:
+        key (str): Name of the group of tables, e.g. 'catalog'
+        version (int): Incremented on every write to the group
+        updated_at (datetime): When the version last changed
+    """
+    key = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
@@ -0,0 +1,243 @@
+# Keyset Pagination Module
+# Pages through supplies by seeking past the last (name, id) seen instead of
+# using OFFSET, so any page costs the same as the first; totals are counted at
+# most once per catalog version and capped for broad filters
+
+
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from .versions import CATALOG, get_version
+
+# Pages linked on either side of the current page in the page bar
+PAGE_WINDOW = 2
+
+# Totals stop counting here and are shown as "10,000+"
+COUNT_LIMIT = 10000
+
+# Seconds a cached total is kept; it is also dropped by any catalog write
+COUNT_TIMEOUT = 10 * 60
+
+
+def encode_cursor(key, number):
+    """
+    Encode a (name, id) key and its page number as an opaque URL-safe token
+    """
+    data = json.dumps([key[0], key[1], number], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(token):
+    """
+    Decode a token from encode_cursor
+
+    Returns:
+        tuple: ((name, id), page number), or None if the token is invalid
+    """
+    try:
+        name, supply_id, number = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if isinstance(name, str) and isinstance(supply_id, int) and (number is None or isinstance(number, int)):
+            return (name, supply_id), number
+    except (ValueError, TypeError):
+        pass
+    return None
+
+
+def cached_count(queryset, signature, limit=COUNT_LIMIT, version_key=CATALOG):
+    """
+    Count a filtered queryset once per filter signature and data version
+
+    The count stops at limit + 1 rows, so a broad filter costs no more than
+    reading that many index entries; the caller shows such totals as "limit+".
+    Totals are cached under the data version, so any write to the catalog
+    makes every cached total unreachable instead of stale.
+
+    Args:
+        queryset (QuerySet): Filtered queryset to count
+        signature (str): Normalized filters (see filters.filter_signature)
+        limit (int, optional): Highest exact count. Defaults to COUNT_LIMIT.
+        version_key (str, optional): Data version the count depends on. Defaults to CATALOG.
+
+    Returns:
+        tuple: (count, exact); count is limit when exact is False
+    """
+    digest = hashlib.blake2b(signature.encode('utf-8'), digest_size=16).hexdigest()
+    key = f'count:{version_key}:{get_version(version_key)}:{limit}:{digest}'
+    count = cache.get(key)
+    if count is None:
+        count = queryset.order_by()[:limit + 1].count()
+        cache.set(key, count, COUNT_TIMEOUT)
+    return min(count, limit), count <= limit
+
+
+class SupplyPage:
+    """
+    One page of supplies with the query strings that select its neighbours.
+
+    Iterating the page yields its supplies, like a Django Page. Links are
+    query fragments ('after=...', 'page=3'), so the template renders keyset
+    and ranked pages the same way.
+
+    Attributes:
+        object_list (list): Supplies on this page
+        number (int): Page number, None when reached from the end of an unknown total
+        previous_query (str): Query for the previous page, '' if none
+        next_query (str): Query for the next page, '' if none
+        last_query (str): Query for the last page, '' if this is the last page
+        previous_links (list): (page number, query) for nearby earlier pages, in order
+        next_links (list): (page number, query) for nearby later pages, in order
+        more_before (bool): Whether pages exist beyond the linked ones before this page
+        more_after (bool): Whether pages exist beyond the linked ones after this page
+    """
+    def __init__(self, object_list, number):
+        self.object_list = object_list
+        self.number = number
+        self.previous_query = ''
+        self.next_query = ''
+        self.last_query = ''
+        self.previous_links = []
+        self.next_links = []
+        self.more_before = False
+        self.more_after = False
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_previous(self):
+        return bool(self.previous_query)
+
+    @property
+    def has_next(self):
+        return bool(self.next_query)
+
+
+def load_page(queryset, ids):
+    """
+    Load supplies by id, in the order of ids, keeping select/prefetch options
+    """
+    objects = {supply.id: supply for supply in queryset.filter(id__in=ids).order_by()}
+    return [objects[supply_id] for supply_id in ids if supply_id in objects]
+
+
+def keyset_page(queryset, params, per_page=20, window=PAGE_WINDOW):
+    """
+    Fetch one page of a supply queryset by keyset on (name, id)
+
+    The page is selected by an 'after' or 'before' cursor token, or 'last=1'
+    for the final page. Keys of up to `window` pages on each side are read
+    with a narrow index-only query to build the page bar, then only the
+    current page's rows are loaded as model instances.
+
+    Args:
+        queryset (QuerySet): Filtered supplies; select/prefetch options are kept
+        params (QueryDict): Request GET parameters
+        per_page (int, optional): Supplies per page. Defaults to 20.
+        window (int, optional): Neighbouring pages to link on each side. Defaults to PAGE_WINDOW.
+
+    Returns:
+        SupplyPage: The requested page
+    """
+    forward = queryset.order_by('name', 'id')
+    backward = queryset.order_by('-name', '-id')
+    keys = ('name', 'id')
+
+    def after(qs, key):
+        # name >= x drives the index range scan; the exclude handles the tie on name
+        return qs.filter(name__gte=key[0]).exclude(name=key[0], id__lte=key[1])
+
+    def before(qs, key):
+        return qs.filter(name__lte=key[0]).exclude(name=key[0], id__gte=key[1])
+
+    after_cursor = decode_cursor(params.get('after', ''))
+    before_cursor = decode_cursor(params.get('before', ''))
+    page_keys = []
+    number = 1
+    if before_cursor:
+        key, number = before_cursor
+        page_keys = list(before(backward, key).values_list(*keys)[:per_page])[::-1]
+        if len(page_keys) < per_page:
+            # Reached the start: show a full first page rather than a short one
+            page_keys = []
+            number = 1
+    elif params.get('last'):
+        page_keys = list(backward.values_list(*keys)[:per_page])[::-1]
+        number = None
+    elif after_cursor:
+        key, number = after_cursor
+
+    if not page_keys:
+        start = after(forward, after_cursor[0]) if after_cursor and not before_cursor else forward
+        page_keys = list(start.values_list(*keys)[:per_page])
+
+    # Keys of the following pages, then of the preceding ones
+    later = []
+    earlier = []
+    if page_keys:
+        later = list(after(forward, page_keys[-1]).values_list(*keys)[:per_page * window])
+        if number != 1:
+            earlier = list(before(backward, page_keys[0]).values_list(*keys)[:per_page * window])
+
+    page = SupplyPage(load_page(queryset, [supply_id for _, supply_id in page_keys]), number)
+    page.more_before = len(earlier) == per_page * window and number != window + 1
+    page.more_after = len(later) == per_page * window
+
+    def page_number(offset):
+        return number + offset if number is not None else None
+
+    if earlier:
+        page.previous_query = 'before=' + encode_cursor(page_keys[0], page_number(-1))
+        for k in range(window, 0, -1):
+            if len(earlier) > per_page * (k - 1) and (number is None or number - k >= 1):
+                boundary = page_keys[0] if k == 1 else earlier[per_page * (k - 1) - 1]
+                page.previous_links.append((page_number(-k), 'before=' + encode_cursor(boundary, page_number(-k))))
+    if later:
+        page.next_query = 'after=' + encode_cursor(page_keys[-1], page_number(1))
+        if not params.get('last'):
+            page.last_query = 'last=1'
+        for k in range(1, window + 1):
+            if len(later) > per_page * (k - 1):
+                boundary = page_keys[-1] if k == 1 else later[per_page * (k - 1) - 1]
+                page.next_links.append((page_number(k), 'after=' + encode_cursor(boundary, page_number(k))))
+    return page
+
+
+def ranked_page(queryset, ranked_ids, params, per_page=20, window=PAGE_WINDOW):
+    """
+    Fetch one page of a precomputed, relevance ordered list of supply ids
+
+    The list is already capped (see search.SEARCH_LIMIT), so pages are
+    addressed by number and sliced from it in memory.
+
+    Args:
+        queryset (QuerySet): Supplies; select/prefetch options are kept
+        ranked_ids (list): Supply ids, best match first
+        params (QueryDict): Request GET parameters ('page')
+        per_page (int, optional): Supplies per page. Defaults to 20.
+        window (int, optional): Neighbouring pages to link on each side. Defaults to PAGE_WINDOW.
+
+    Returns:
+        SupplyPage: The requested page
+    """
+    pages = max(1, -(-len(ranked_ids) // per_page))
+    try:
+        number = min(max(int(params.get('page', 1)), 1), pages)
+    except ValueError:
+        number = 1
+    start = (number - 1) * per_page
+    page = SupplyPage(load_page(queryset, ranked_ids[start:start + per_page]), number)
+    if number > 1:
+        page.previous_query = f'page={number - 1}'
+    if number < pages:
+        page.next_query = f'page={number + 1}'
+        page.last_query = f'page={pages}'
+    page.previous_links = [(n, f'page={n}') for n in range(max(1, number - window), number)]
+    page.next_links = [(n, f'page={n}') for n in range(number + 1, min(pages, number + window) + 1)]
+    page.more_before = number - window > 1
+    page.more_after = number + window < pages
+    return page
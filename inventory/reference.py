@@ -0,0 +1,107 @@
+# Reference Data Module
+# Process-local cache of the categories and tags listed in filter dropdowns
+# and supply forms, so rendering them costs no queries while it is warm
+
+
+import threading
+import time
+from collections import namedtuple
+
+from django.forms.models import ModelChoiceIterator
+from .models import Category, Tag
+from .versions import REFERENCE, get_version
+
+# Seconds between checks for category and tag writes made by other processes
+CHECK_INTERVAL = 2.0
+
+Reference = namedtuple('Reference', ['categories', 'tags'])
+
+
+class ReferenceCache:
+    """
+    Categories and tags loaded once per process and reloaded when they change.
+
+    Writes in this process invalidate the cache through model signals. Other
+    processes (gunicorn workers, the import worker) bump the REFERENCE data
+    version, which is checked at most every CHECK_INTERVAL seconds, so a
+    change made elsewhere shows up within that interval.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = None
+        self.version = None
+        self.checked = 0.0
+
+    def get(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.data is None or now - self.checked >= CHECK_INTERVAL:
+                # Version first: a write landing during the load only causes a second load
+                version = get_version(REFERENCE)
+                self.checked = now
+                if self.data is None or version != self.version:
+                    self.data = Reference(tuple(Category.objects.all()), tuple(Tag.objects.all()))
+                    self.version = version
+            return self.data
+
+    def invalidate(self):
+        with self.lock:
+            self.data = None
+
+
+reference_cache = ReferenceCache()
+
+
+def reference_data():
+    """
+    Return the cached categories and tags
+
+    Returns:
+        Reference: categories and tags as tuples of model instances, ordered by name
+    """
+    return reference_cache.get()
+
+
+def reference_version():
+    """
+    Return the categories and tags version the cached data was loaded at
+    """
+    reference_cache.get()
+    return reference_cache.version
+
+
+class CachedChoiceIterator(ModelChoiceIterator):
+    """
+    Choice iterator for a model choice field that lists cached instances
+    instead of querying the field's queryset
+    """
+    def __init__(self, field, objects):
+        super().__init__(field)
+        self.objects = objects
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for obj in self.objects:
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.objects) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.objects)
+
+
+def use_cached_choices(field, objects):
+    """
+    Render a ModelChoiceField's options from cached instances
+
+    The field's queryset is kept for validating submitted values, so a
+    stale cache can never accept a row that no longer exists.
+
+    Args:
+        field (ModelChoiceField): Form field, single or multiple choice
+        objects (tuple): Instances to list, in display order
+    """
+    field.iterator = lambda field: CachedChoiceIterator(field, objects)
+    field.widget.choices = field.choices
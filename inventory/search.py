@@ -0,0 +1,158 @@
+# Supply Search Module
+# Full-text search over supply name, category, tags and location using the
+# SQLite FTS5 table maintained by triggers (migration 0009), with an icontains
+# fallback on databases without it
+
+
+import re
+from contextlib import contextmanager
+
+from django.db import connection, models, transaction
+from django.db.models.expressions import RawSQL
+
+# Best matches kept for a ranked search result list
+SEARCH_LIMIT = 1000
+
+# Matches scored per search; bm25 costs time per matching row, so very broad
+# queries are ranked within the first RANK_CANDIDATES matches only
+RANK_CANDIDATES = 2000
+
+# bm25 column weights: name, category, tags, location
+RANK_SQL = 'bm25(inventory_supply_fts, 10.0, 2.0, 4.0, 1.0)'
+
+WORD_RE = re.compile(r'\w+')
+
+# Builds the search documents of the supplies matched by a WHERE clause on s.
+# This is the one definition; the triggers of migration 0009 embed a copy, so
+# a change here needs a new migration that recreates them
+DOCUMENT_SQL = '''
+    INSERT INTO inventory_supply_fts(rowid, name, category, tags, location)
+    SELECT s.id, s.name, COALESCE(c.name, ''),
+           COALESCE((SELECT group_concat(t.name, ' ')
+                     FROM inventory_supply_tags st JOIN inventory_tag t ON t.id = st.tag_id
+                     WHERE st.supply_id = s.id), ''),
+           s.location
+    FROM inventory_supply s LEFT JOIN inventory_category c ON c.id = s.category_id
+    WHERE {where}
+'''
+
+
+def fts_enabled():
+    """
+    Whether the database has the FTS5 supply index
+    """
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(text):
+    """
+    Build an FTS5 MATCH expression that prefix-matches every word of the query
+
+    Words are quoted, so FTS5 operators typed by the user are searched as text.
+
+    Args:
+        text (str): Search box contents
+
+    Returns:
+        str: e.g. '"cat"* "litt"*', or '' if the text has no words
+    """
+    return ' '.join(f'"{word}"*' for word in WORD_RE.findall(text.lower()))
+
+
+def search_filter(queryset, text):
+    """
+    Restrict a supply queryset to full-text matches, keeping its ordering
+
+    Args:
+        queryset (QuerySet): Supplies to filter
+        text (str): Search box contents
+
+    Returns:
+        QuerySet: Matching supplies
+    """
+    expression = match_expression(text) if fts_enabled() else ''
+    if not expression:
+        return queryset.filter(models.Q(name__icontains=text) | models.Q(location__icontains=text))
+    return queryset.filter(id__in=RawSQL(
+        'SELECT rowid FROM inventory_supply_fts WHERE inventory_supply_fts MATCH %s', [expression]))
+
+
+def ranked_supply_ids(text, queryset=None, limit=SEARCH_LIMIT):
+    """
+    Return the ids of the best matching supplies, most relevant first
+
+    At most RANK_CANDIDATES matches are scored, which keeps a one-letter
+    prefix matching half the catalog as cheap as a selective query.
+
+    Args:
+        text (str): Search box contents
+        queryset (QuerySet, optional): Only rank supplies in this queryset (other filters)
+        limit (int, optional): Maximum number of ids. Defaults to SEARCH_LIMIT.
+
+    Returns:
+        list: Supply ids ordered by rank, or None if ranked search is unavailable for this text
+    """
+    expression = match_expression(text) if fts_enabled() else ''
+    if not expression:
+        return None
+    sql = f'SELECT rowid, {RANK_SQL} AS score FROM inventory_supply_fts WHERE inventory_supply_fts MATCH %s'
+    params = [expression]
+    if queryset is not None:
+        subquery, subquery_params = queryset.values('id').query.sql_with_params()
+        sql += f' AND rowid IN ({subquery})'
+        params.extend(subquery_params)
+    sql = f'SELECT rowid FROM ({sql} LIMIT %s) ORDER BY score LIMIT %s'
+    params.extend([max(RANK_CANDIDATES, limit), limit])
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+@contextmanager
+def search_triggers_paused():
+    """
+    Skip the per-row search index triggers for a block of bulk writes
+
+    The pause is a row that only exists inside this block's transaction, so
+    it is never visible to other connections and is rolled back on errors.
+    Call reindex_supplies for the written supplies before leaving the block.
+    """
+    if not fts_enabled():
+        yield
+        return
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('INSERT INTO inventory_supply_fts_pause DEFAULT VALUES')
+        yield
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM inventory_supply_fts_pause')
+
+
+def reindex_supplies(supply_ids):
+    """
+    Rebuild the search documents of the given supplies in two statements
+
+    Args:
+        supply_ids (list): Ids of supplies that were inserted or changed
+    """
+    if not fts_enabled() or not supply_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(supply_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM inventory_supply_fts WHERE rowid IN ({placeholders})', supply_ids)
+        cursor.execute(DOCUMENT_SQL.format(where=f's.id IN ({placeholders})'), supply_ids)
+
+
+def rebuild_search_index():
+    """
+    Recreate every search document from the supply tables
+
+    Returns:
+        int: Number of supplies indexed
+    """
+    if not fts_enabled():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM inventory_supply_fts')
+        cursor.execute(DOCUMENT_SQL.format(where='1'))
+        return cursor.rowcount
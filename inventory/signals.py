@@ -0,0 +1,71 @@
+# Signal Handlers Module
+# Keeps data version stamps and in-process indexes current for writes made
+# through the ORM; bulk writes that bypass signals bump the version themselves
+# (see importers) and other processes catch up from it
+
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from .fuzzy import supply_names
+from .reference import reference_cache
+from .suggest import suggestions
+from .models import Supply, Category, Tag
+from .versions import CATALOG, REFERENCE, bump_version
+
+
+@receiver(post_save, sender=Supply)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Supply)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Tag)
+def catalog_changed(sender, **kwargs):
+    bump_version(CATALOG)
+
+
+@receiver(m2m_changed, sender=Supply.tags.through)
+def supply_tags_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(CATALOG)
+
+
+@receiver(post_save, sender=Supply)
+def supply_saved(sender, instance, **kwargs):
+    # Applied on commit so a rolled back save never reaches the index
+    def apply():
+        supply_names.supply_saved(instance)
+        suggestions.supply_saved(instance)
+    transaction.on_commit(apply)
+
+
+@receiver(post_delete, sender=Supply)
+def supply_deleted(sender, instance, **kwargs):
+    supply_id = instance.pk
+    def apply():
+        supply_names.supply_deleted(supply_id)
+        suggestions.supply_deleted(supply_id)
+    transaction.on_commit(apply)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Tag)
+def reference_saved(sender, instance, **kwargs):
+    bump_version(REFERENCE)
+    field = 'category' if sender is Category else 'tag'
+    def apply():
+        reference_cache.invalidate()
+        suggestions.reference_saved(field, instance.pk, instance.name)
+    transaction.on_commit(apply)
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Tag)
+def reference_deleted(sender, instance, **kwargs):
+    bump_version(REFERENCE)
+    field = 'category' if sender is Category else 'tag'
+    item_id = instance.pk
+    def apply():
+        reference_cache.invalidate()
+        suggestions.reference_deleted(field, item_id)
+    transaction.on_commit(apply)
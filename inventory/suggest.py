@@ -0,0 +1,324 @@
+# Suggestion Module
+# Sorted in-memory prefix indexes of supply names, locations, categories and
+# tags for completing what is typed in the index page's filter boxes
+
+
+import bisect
+import heapq
+import threading
+import time
+
+from django.db.models import Max
+from .fuzzy import REFRESH_INTERVAL, SYNC_LOOKBACK, normalize
+from .models import Supply, Category, Tag
+from .versions import CATALOG, get_version
+
+# Fields that can be completed, in the order they are returned
+SUGGEST_FIELDS = ('name', 'location', 'category', 'tag')
+
+# Ranked completions of prefixes matching more keys than this are memoized
+# until the field changes
+MEMO_THRESHOLD = 200
+
+# Sorts after any character, so prefix + KEY_END bounds the keys starting with prefix
+KEY_END = '\U0010ffff'
+
+# A refresh that finds more changed supplies than this reloads the indexes in
+# one sort instead of merging the changes in
+RELOAD_THRESHOLD = 1000
+
+
+class PrefixIndex:
+    """
+    Sorted list of completion keys, searched by bisection.
+
+    Every value is indexed from the start of each of its words, so 'litt'
+    completes 'Cat Litter'. A key is the folded text from that word on, then
+    a separator and the whole folded value, which keeps keys unique per value
+    and sorts ties alphabetically.
+
+    Attributes:
+        keys (list): Sorted completion keys
+        values (dict): Folded value to [display text, number of uses]
+        ranked (bool): Order completions by number of uses rather than alphabetically
+    """
+    def __init__(self, ranked=False):
+        self.keys = []
+        self.values = {}
+        self.ranked = ranked
+        self.memo = {}
+
+    @staticmethod
+    def key_parts(folded):
+        words = folded.split()
+        return [' '.join(words[i:]) + '\x00' + folded for i in range(len(words))]
+
+    def add(self, text, uses=1):
+        folded = normalize(text or '')
+        if not folded:
+            return
+        entry = self.values.get(folded)
+        if entry:
+            entry[1] += uses
+        else:
+            self.values[folded] = [text, uses]
+            for key in self.key_parts(folded):
+                bisect.insort(self.keys, key)
+        self.memo.clear()
+
+    def discard(self, text, uses=1):
+        folded = normalize(text or '')
+        entry = self.values.get(folded)
+        if not entry:
+            return
+        entry[1] -= uses
+        if entry[1] <= 0:
+            del self.values[folded]
+            for key in self.key_parts(folded):
+                position = bisect.bisect_left(self.keys, key)
+                if position < len(self.keys) and self.keys[position] == key:
+                    del self.keys[position]
+        self.memo.clear()
+
+    def update(self, added=(), removed=()):
+        """
+        Apply many (text, uses) additions and removals with one pass over the keys
+
+        Each add() or discard() of a new or vanished value shifts the key list,
+        so a batch of them is quadratic; here the keys of values that vanish are
+        filtered out and those of new values are sorted and merged in once.
+
+        Args:
+            added (iterable): (text, uses) pairs to count in
+            removed (iterable): (text, uses) pairs to count out
+        """
+        # Additions are counted before removals, so a value that moves between
+        # supplies in the batch never drops out of the index
+        present = {}
+        for pairs, sign in ((added, 1), (removed, -1)):
+            for text, uses in pairs:
+                folded = normalize(text or '')
+                if not folded:
+                    continue
+                entry = self.values.get(folded)
+                present.setdefault(folded, entry is not None)
+                if entry:
+                    entry[1] += sign * uses
+                elif sign > 0:
+                    self.values[folded] = [text, uses]
+        gone, new = set(), []
+        for folded, was_present in present.items():
+            entry = self.values.get(folded)
+            if entry and entry[1] <= 0:
+                del self.values[folded]
+                entry = None
+            if was_present and not entry:
+                gone.update(self.key_parts(folded))
+            elif entry and not was_present:
+                new.extend(self.key_parts(folded))
+        if gone:
+            self.keys = [key for key in self.keys if key not in gone]
+        if new:
+            self.keys = list(heapq.merge(self.keys, sorted(new)))
+        self.memo.clear()
+
+    def load(self, counts):
+        """
+        Replace the contents with (text, uses) pairs in one sort
+        """
+        self.values = {}
+        for text, uses in counts:
+            folded = normalize(text or '')
+            if not folded:
+                continue
+            entry = self.values.setdefault(folded, [text, 0])
+            entry[1] += uses
+        self.keys = sorted(key for folded in self.values for key in self.key_parts(folded))
+        self.memo = {}
+
+    def complete(self, prefix, limit=8):
+        """
+        Return up to `limit` values with a word starting with prefix
+
+        Args:
+            prefix (str): Text typed so far
+            limit (int, optional): Maximum number of completions. Defaults to 8.
+
+        Returns:
+            list: Display texts, most used first if ranked, otherwise alphabetical
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + KEY_END, lo)
+        if not self.ranked or hi - lo <= limit:
+            # Keys are in order already; skip values matched from several words
+            found = []
+            for position in range(lo, hi):
+                folded = self.keys[position].partition('\x00')[2]
+                if folded not in found:
+                    found.append(folded)
+                    if len(found) == limit:
+                        break
+            if self.ranked:
+                found.sort(key=lambda folded: -self.values[folded][1])
+            return [self.values[folded][0] for folded in found]
+
+        memo_key = (prefix, limit)
+        if memo_key in self.memo:
+            return self.memo[memo_key]
+        folded_values = {key.partition('\x00')[2] for key in self.keys[lo:hi]}
+        best = heapq.nsmallest(limit, folded_values, key=lambda folded: (-self.values[folded][1], folded))
+        result = [self.values[folded][0] for folded in best]
+        if hi - lo > MEMO_THRESHOLD:
+            self.memo[memo_key] = result
+        return result
+
+
+class SuggestionIndex:
+    """
+    Process-wide prefix indexes for the filter boxes, kept in step with the database.
+
+    Loaded on first use and updated by model signals in this process. Writes
+    from other processes are picked up like the fuzzy name index: at most
+    every REFRESH_INTERVAL seconds the catalog version is checked and only
+    supplies changed since the last sync are re-read; categories and tags
+    are small and reloaded whole.
+
+    Attributes:
+        fields (dict): Field name to PrefixIndex
+        supplies (dict): Supply id to the (name, location) it was indexed with
+        reference (dict): 'category' and 'tag' to a dict of id to name
+    """
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.fields = None
+        self.version = None
+        self.synced_at = None
+        self.checked = 0.0
+
+    def load(self):
+        version = get_version(CATALOG)
+        synced_at = Supply.objects.aggregate(latest=Max('updated_at'))['latest']
+        self.supplies = {
+            supply_id: (name, location)
+            for supply_id, name, location in Supply.objects.values_list('id', 'name', 'location').iterator(chunk_size=5000)
+        }
+        names = PrefixIndex()
+        names.load((name, 1) for name, _ in self.supplies.values())
+        locations = PrefixIndex(ranked=True)
+        locations.load((location, 1) for _, location in self.supplies.values())
+        self.fields = {'name': names, 'location': locations,
+                       'category': PrefixIndex(), 'tag': PrefixIndex()}
+        self.load_reference()
+        self.version, self.synced_at = version, synced_at
+        self.checked = time.monotonic()
+
+    def load_reference(self):
+        self.reference = {
+            'category': dict(Category.objects.values_list('id', 'name')),
+            'tag': dict(Tag.objects.values_list('id', 'name')),
+        }
+        for field, records in self.reference.items():
+            self.fields[field].load((name, 1) for name in records.values())
+
+    def refresh(self):
+        """
+        Apply writes made by other processes since the last check
+        """
+        self.checked = time.monotonic()
+        version = get_version(CATALOG)
+        if version == self.version:
+            return
+        changed = Supply.objects.all()
+        if self.synced_at is not None:
+            changed = changed.filter(updated_at__gte=self.synced_at - SYNC_LOOKBACK)
+        rows = list(changed.values_list('id', 'name', 'location', 'updated_at')[:RELOAD_THRESHOLD + 1])
+        if len(rows) > RELOAD_THRESHOLD:
+            self.load()
+            return
+        latest = self.synced_at
+        names, locations = ([], []), ([], [])
+        for supply_id, name, location, updated_at in rows:
+            old = self.supplies.get(supply_id)
+            if old != (name, location):
+                if old:
+                    names[1].append((old[0], 1))
+                    locations[1].append((old[1], 1))
+                self.supplies[supply_id] = (name, location)
+                names[0].append((name, 1))
+                locations[0].append((location, 1))
+            latest = updated_at if latest is None else max(latest, updated_at)
+        self.fields['name'].update(*names)
+        self.fields['location'].update(*locations)
+        self.synced_at = latest
+        self.version = version
+        self.load_reference()
+        # Deletions leave no updated_at trace; reload if the counts disagree
+        if Supply.objects.count() != len(self.supplies):
+            self.load()
+
+    def apply_supply(self, supply_id, name, location):
+        old = self.supplies.get(supply_id)
+        if old == (name, location):
+            return
+        if old:
+            self.fields['name'].discard(old[0])
+            self.fields['location'].discard(old[1])
+        self.supplies[supply_id] = (name, location)
+        self.fields['name'].add(name)
+        self.fields['location'].add(location)
+
+    def complete(self, prefix, fields=SUGGEST_FIELDS, limit=8):
+        """
+        Complete a prefix in each of the given fields
+
+        Returns:
+            dict: Field name to list of completions
+        """
+        with self.lock:
+            if self.fields is None:
+                self.load()
+            elif time.monotonic() - self.checked >= REFRESH_INTERVAL:
+                self.refresh()
+            return {field: self.fields[field].complete(prefix, limit) for field in fields}
+
+    def supply_saved(self, supply):
+        with self.lock:
+            if self.fields is not None:
+                self.apply_supply(supply.id, supply.name, supply.location)
+
+    def supply_deleted(self, supply_id):
+        with self.lock:
+            if self.fields is not None and supply_id in self.supplies:
+                name, location = self.supplies.pop(supply_id)
+                self.fields['name'].discard(name)
+                self.fields['location'].discard(location)
+
+    def reference_saved(self, field, item_id, name):
+        with self.lock:
+            if self.fields is None:
+                return
+            records = self.reference[field]
+            if records.get(item_id) == name:
+                return
+            if item_id in records:
+                self.fields[field].discard(records[item_id])
+            records[item_id] = name
+            self.fields[field].add(name)
+
+    def reference_deleted(self, field, item_id):
+        with self.lock:
+            if self.fields is None:
+                return
+            name = self.reference[field].pop(item_id, None)
+            if name is not None:
+                self.fields[field].discard(name)
+
+    def reset(self):
+        with self.lock:
+            self.fields = None
+
+
+suggestions = SuggestionIndex()
@@ -0,0 +1,14 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..fragments import render_supply_row
+from ..reference import reference_version
+from .auth_extras import can_edit
+
+register = template.Library()
+
+@register.simple_tag(takes_context=True)
+def supply_row(context, supply):
+    user = context['user']
+    role = 'editor' if can_edit(user) else 'viewer'
+    return mark_safe(render_supply_row(supply, user, role, reference_version()))
@@ -1,3 +1,821 @@
-from django.test import TestCase
+import csv
+import gc
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from smtplib import SMTPException
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.http import QueryDict
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .alerts import deliver_alerts
+from .forecast import update_forecasts
+from .fragments import row_cache_key, row_cache_stats
+from .fuzzy import TrigramIndex
+from .importers import (
+    ErrorReport, detect_format, import_supplies_file, import_supply_receipts, parse_file_parallel, run_import_job,
+)
+from .models import AuditLog, Category, ImportCheckpoint, ImportJob, LowStockAlert, StockForecast, Supply, Tag
+from .pagination import COUNT_LIMIT, cached_count, encode_cursor, keyset_page
+from .reorder import apply_reorder_points, projected_alert_volume, recommend_reorder_points
+from .uploadhandlers import SpoolingUploadHandler
+
+BULK_HEADER = 'Name,Category,Tags,Price,Quantity,Reorder Point,Location\n'
+
+
+def peak_memory(func, *args, **kwargs):
+    """
+    Run func and return the peak Python heap size it reached, in bytes
+    """
+    # Start from a collected heap so garbage left by earlier tests does not skew the peak
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class StreamingImportMemoryTests(TestCase):
+    """
+    Memory benchmarks: peak usage of the import paths must not grow with file size.
+    """
+
+    def write_file(self, content_lines):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.writelines(content_lines)
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def bulk_file(self, rows):
+        lines = (
+            f'Supply {i},Category {i % 10},Dog Tag{i % 7},${i % 90}.99,{i % 50},{i % 9},R{i % 30}\n'
+            for i in range(rows)
+        )
+        return self.write_file([BULK_HEADER, *lines])
+
+    def test_upload_handler_spools_to_disk(self):
+        request = RequestFactory().post('/supplies/import/')
+        handler = SpoolingUploadHandler(request)
+        chunk = b'x' * handler.chunk_size
+        chunks = 128  # 32 MB
+
+        def upload():
+            handler.new_file('file', 'big.csv', 'text/csv', None)
+            for i in range(chunks):
+                handler.receive_data_chunk(chunk, i * len(chunk))
+            return handler.file_complete(chunks * len(chunk))
+
+        peak = peak_memory(upload)
+        uploaded = handler.file
+        self.addCleanup(uploaded.close)
+        self.assertEqual(os.path.getsize(uploaded.temporary_file_path()), chunks * len(chunk))
+        self.assertEqual(len(uploaded.sha256), 64)
+        self.assertLess(peak, 4 * len(chunk))
+
+    def test_bulk_import_memory_is_flat(self):
+        small = self.bulk_file(1000)
+        large = self.bulk_file(10000)
+        # Warm up query and statement caches so they are not counted as growth
+        import_supplies_file(self.bulk_file(10), chunk_size=500)
+        small_peak = peak_memory(import_supplies_file, small, chunk_size=500)
+        Supply.objects.all().delete()
+        large_peak = peak_memory(import_supplies_file, large, chunk_size=500)
+        self.assertEqual(Supply.objects.count(), 10000)
+        self.assertLess(large_peak, small_peak * 1.25)
+
+    def test_parallel_parse_memory_is_flat(self):
+        def parse(path):
+            records = parse_file_parallel(path, 2, shard_bytes=32 * 1024)
+            next(records)
+            # A slow writer: the parsers must not run ahead of it
+            time.sleep(1)
+            for _ in records:
+                pass
+
+        small = self.bulk_file(2000)
+        large = self.bulk_file(20000)
+        parse(small)  # Warm up
+        small_peak = peak_memory(parse, small)
+        large_peak = peak_memory(parse, large)
+        self.assertLess(large_peak, small_peak * 1.25)
+
+    def test_receipt_import_memory_is_flat(self):
+        supply = Supply.objects.create(name='Dog Food', price=1, quantity=0, location='A1', reorder_point=5)
+
+        def receive(path):
+            with open(path, 'rb') as raw:
+                text_file = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+                import_supply_receipts(supply, text_file, None, chunk_size=250)
+
+        small = self.write_file(['Name,Quantity\n', *(f'Dog Food,{i % 5}\n' for i in range(5000))])
+        large = self.write_file(['Name,Quantity\n', *(f'Dog Food,{i % 5}\n' for i in range(25000))])
+        receive(small)  # Warm up caches
+        small_peak = peak_memory(receive, small)
+        large_peak = peak_memory(receive, large)
+        supply.refresh_from_db()
+        self.assertEqual(supply.quantity, 2 * 10000 + 50000)
+        self.assertLess(large_peak, small_peak * 1.25)
+
+
+# Tables large enough that reading one whole, or sorting an unbounded part of
+# it, is a regression
+HOT_TABLES = {'inventory_supply', 'inventory_supply_tags', 'inventory_auditlog'}
+
+# A sort is fine over rows fetched one key at a time (a page of supplies and
+# their tags), or over full-text candidates, which the query caps itself
+KEYED_LOOKUP_RE = re.compile(r'\((rowid|supply_id)=\?\)')
+
+
+def partial_indexes():
+    """
+    Return the names of indexes that only hold rows matching a WHERE clause
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def plan_problems(sql, plan, partial=frozenset()):
+    """
+    Return what is wrong with a query plan from EXPLAIN QUERY PLAN
+
+    A table scan of a hot table is always a problem. So is walking a whole
+    index and reading every row it points to, unless the query stops at a
+    LIMIT or the index is partial. Walking a covering index, as counts do,
+    never touches the rows and is allowed.
+
+    Args:
+        sql (str): The query
+        plan (list): Detail column of each plan row
+        partial (set, optional): Names of partial indexes
+
+    Returns:
+        list: Descriptions of full scans of hot tables and unbounded sorts
+    """
+    problems = []
+    for detail in plan:
+        scan = re.fullmatch(r'SCAN (\w+)(?: USING INDEX (\w+))?', detail)
+        if not scan or scan.group(1) not in HOT_TABLES:
+            continue
+        if scan.group(2) is None:
+            problems.append(f'full scan of {scan.group(1)}')
+        elif ' LIMIT ' not in sql and scan.group(2) not in partial:
+            problems.append(f'full scan of {scan.group(1)} through {scan.group(2)}')
+    if any(detail.startswith('USE TEMP B-TREE FOR ORDER BY') for detail in plan):
+        reads = [detail for detail in plan if re.match(r'(SCAN|SEARCH) inventory_(supply|supply_tags|auditlog)\b', detail)]
+        bounded = ' MATCH ' in sql or all(KEYED_LOOKUP_RE.search(detail) for detail in reads)
+        if not bounded:
+            problems.append('temporary sort')
+    return problems
+
+
+class BulkImportTests(TestCase):
+    """
+    Behaviour of bulk file imports: rejected rows, import modes and resuming.
+    """
+
+    def write_file(self, data, suffix='.csv'):
+        with tempfile.NamedTemporaryFile('wb', suffix=suffix, delete=False) as f:
+            f.write(data)
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def csv_lines(self, rows, start=0):
+        return [f'Supply {i},Food,Dog Tag{i % 3},$1.50,{i},2,R{i % 5}\n'.encode() for i in range(start, rows)]
+
+    def report(self):
+        text = io.StringIO()
+        return ErrorReport(text), text
+
+    def test_dry_run_writes_nothing(self):
+        import_supplies_file(self.write_file(BULK_HEADER.encode() + b''.join(self.csv_lines(5))))
+        before = {
+            'supplies': list(Supply.objects.order_by('id').values_list('name', 'quantity', 'updated_at')),
+            'categories': list(Category.objects.values_list('name', flat=True)),
+            'tags': list(Tag.objects.values_list('name', flat=True)),
+            'links': list(Supply.tags.through.objects.values_list('supply_id', 'tag_id')),
+            'audit': AuditLog.objects.count(),
+            'checkpoints': ImportCheckpoint.objects.count(),
+        }
+        lines = self.csv_lines(7)
+        lines[1] = b'Supply 1,Toys,Squeaky Dog Tag1,$1.50,99,2,R1\n'
+        result = import_supplies_file(self.write_file(BULK_HEADER.encode() + b''.join(lines)), dry_run=True)
+        self.assertEqual((result.created, result.updated, result.unchanged), (2, 1, 4))
+        self.assertEqual(before, {
+            'supplies': list(Supply.objects.order_by('id').values_list('name', 'quantity', 'updated_at')),
+            'categories': list(Category.objects.values_list('name', flat=True)),
+            'tags': list(Tag.objects.values_list('name', flat=True)),
+            'links': list(Supply.tags.through.objects.values_list('supply_id', 'tag_id')),
+            'audit': AuditLog.objects.count(),
+            'checkpoints': ImportCheckpoint.objects.count(),
+        })
+
+    def test_only_changes_leaves_unchanged_rows_alone(self):
+        import_supplies_file(self.write_file(BULK_HEADER.encode() + b''.join(self.csv_lines(5))))
+        stamps = dict(Supply.objects.values_list('name', 'updated_at'))
+        unchanged_links = Supply.tags.through.objects.exclude(supply__name='Supply 2').order_by('id')
+        links = list(unchanged_links.values_list('id', 'supply_id', 'tag_id'))
+        lines = self.csv_lines(5)
+        lines[2] = b'Supply 2,Food,Dog Tag2,$1.50,12,2,R2\n'
+        result = import_supplies_file(self.write_file(BULK_HEADER.encode() + b''.join(lines)), only_changes=True)
+        self.assertEqual((result.created, result.updated, result.unchanged), (0, 1, 4))
+        after = dict(Supply.objects.values_list('name', 'updated_at'))
+        self.assertEqual({name for name in stamps if after[name] != stamps[name]}, {'Supply 2'})
+        self.assertEqual(list(unchanged_links.values_list('id', 'supply_id', 'tag_id')), links)
+        self.assertEqual(Supply.objects.get(name='Supply 2').quantity, 12)
+
+    def test_gzip_jsonl_import(self):
+        lines = [json.dumps({'name': f'Line {i}', 'category': 'Toys', 'tags': ['Squeaky', f'T{i % 2}'],
+                             'price': '2.50', 'quantity': i, 'reorder_point': 1, 'location': 'B1'}) + '\n'
+                 for i in range(40)]
+        path = self.write_file(gzip.compress(''.join(lines).encode()), '.jsonl.gz')
+        result = import_supplies_file(path)
+        self.assertEqual((result.created, result.error_count), (40, 0))
+        supply = Supply.objects.get(name='Line 7')
+        self.assertEqual((supply.category.name, supply.quantity, supply.location), ('Toys', 7, 'B1'))
+        self.assertEqual(sorted(supply.tags.values_list('name', flat=True)), ['Squeaky', 'T1'])
+
+    def test_gzip_import_resumes_after_interrupt(self):
+        path = self.write_file(gzip.compress(BULK_HEADER.encode() + b''.join(self.csv_lines(45))), '.csv.gz')
+
+        def killed(result):
+            raise RuntimeError('worker killed')
+        with self.assertRaises(RuntimeError):
+            import_supplies_file(path, chunk_size=10, progress=killed)
+        self.assertEqual(Supply.objects.count(), 10)
+
+        result = import_supplies_file(path, chunk_size=10)
+        self.assertEqual((result.resumed_row, result.created), (10, 35))
+        self.assertEqual(Supply.objects.count(), 45)
+
+    def test_detect_format_rejects_binary(self):
+        for data in (b'Name,Price\n\xff\xfe\x00bad\n', gzip.compress(b'{"name": "\xc3\x28"}\n'), b'\x1f\x8b\x08broken'):
+            with self.assertRaisesMessage(ValueError, 'Unsupported file format'):
+                detect_format(io.BytesIO(data))
+        self.assertEqual(detect_format(io.BytesIO(gzip.compress(b'{"name": "x"}\n'))), (True, 'jsonl'))
+        self.assertEqual(detect_format(io.BytesIO(BULK_HEADER.encode())), (False, 'csv'))
+
+    def test_invalid_utf8_rows_are_rejected(self):
+        # The bad bytes are well past the format sniffing window
+        lines = self.csv_lines(300)
+        lines[250] = b'Supply \xff\xfe,Food,,$1.50,3,2,R1\n'
+        report, text = self.report()
+        result = import_supplies_file(self.write_file(BULK_HEADER.encode() + b''.join(lines)), error_report=report)
+        self.assertEqual((result.created, result.error_count), (299, 1))
+        self.assertEqual(list(csv.reader(io.StringIO(text.getvalue())))[1][:3], ['252', '', 'not valid UTF-8'])
+
+        lines = [json.dumps({'name': f'Line {i}', 'price': 1, 'quantity': 1, 'reorder_point': 0}).encode() + b'\n'
+                 for i in range(300)]
+        lines[200] = b'{"name": "Bad \xc3", "price": 1, "quantity": 1, "reorder_point": 0}\n'
+        report, text = self.report()
+        result = import_supplies_file(self.write_file(b''.join(lines), '.jsonl'), error_report=report)
+        self.assertEqual((result.created, result.error_count), (299, 1))
+        self.assertIn('201,,not valid UTF-8', text.getvalue())
+
+    def test_resumed_job_keeps_earlier_rejected_rows(self):
+        lines = self.csv_lines(30)
+        for i in (5, 25):
+            lines[i] = f'Bad {i},Food,,not a price,1,1,R1\n'.encode()
+        data = BULK_HEADER.encode() + b''.join(lines)
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        with override_settings(MEDIA_ROOT=media):
+            job = ImportJob.objects.create(file=SimpleUploadedFile('supplies.csv', data), status='RUNNING',
+                                           file_hash=hashlib.sha256(data).hexdigest())
+            report_path = job.error_report.storage.path(f'import_errors/import_{job.id}_errors.csv')
+            os.makedirs(os.path.dirname(report_path))
+
+            # The first attempt dies after committing 10 rows; it had also reported
+            # a row past its checkpoint, which the resumed run reads again
+            def killed(result):
+                raise RuntimeError('worker killed')
+            with open(report_path, 'w', newline='', encoding='utf-8') as report_file:
+                report = ErrorReport(report_file)
+                with self.assertRaises(RuntimeError):
+                    import_supplies_file(job.file.path, chunk_size=10, progress=killed, file_hash=job.file_hash,
+                                         error_report=report)
+                report.add(27, 'Price', 'not a price', 'Bad 25,Food,,not a price,1,1,R1')
+            ImportJob.objects.filter(id=job.id).update(error_count=1, rows_done=10)
+
+            job = run_import_job(ImportJob.objects.get(id=job.id))
+            self.assertEqual((job.status, job.resumed_from_row, job.error_count), ('DONE', 11, 2))
+            with job.error_report.open('r') as f:
+                rows = list(csv.reader(io.StringIO(f.read())))
+            self.assertEqual([row[0] for row in rows], ['Row', '7', '27'])
+        self.assertEqual(Supply.objects.count(), 28)
+
+class SnapshotExportTests(TestCase):
+    """
+    Exports are served from a snapshot per catalog version, with conditional
+    and ranged requests answered from the file.
+    """
+
+    def setUp(self):
+        snapshots = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, snapshots)
+        self.enterContext(override_settings(EXPORT_SNAPSHOT_DIR=snapshots))
+        self.client.force_login(User.objects.create_superuser('exporter', 'exporter@example.com', 'pw'))
+        Supply.objects.bulk_create([
+            Supply(name=f'Supply {i}', price=i, quantity=i, reorder_point=2, location='A1') for i in range(50)
+        ])
+
+    def get(self, **headers):
+        response = self.client.get('/supplies/export/?format=csv', headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_not_modified(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(body.startswith(b'Name,Category,Tags'))
+        response, _ = self.get(if_none_match=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        _, body = self.get()
+        size = len(body)
+        response, part = self.get(range='bytes=-10')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes {size - 10}-{size - 1}/{size}')
+        self.assertEqual(part, body[-10:])
+
+        response, part = self.get(range='bytes=5-9')
+        self.assertEqual((response.status_code, part), (206, body[5:10]))
+
+        response, _ = self.get(range=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+        # A range for another version of the file gets the whole file
+        response, part = self.get(range='bytes=-10', if_range='"supplies-all-v0.csv.stale"')
+        self.assertEqual((response.status_code, part), (200, body))
+
+    def test_catalog_write_changes_etag(self):
+        response, _ = self.get()
+        etag = response['ETag']
+        supply = Supply.objects.get(name='Supply 3')
+        supply.quantity = 40
+        supply.save()
+        response, body = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(b'Supply 3,,,3.00,40,', body)
+
+class KeysetPaginationTests(TestCase):
+    """
+    Walking the pages by cursor visits every supply once, in (name, id) order.
+    Names are unique, so near ties are used: names that differ only in case
+    or by a suffix, created in an order unrelated to their names.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        names = [f'{base}{suffix}' for base in ('Bowl', 'bowl', 'BOWL', 'Collar', 'collar')
+                 for suffix in ('', ' ', ' 1', ' 10', ' 2', 'x')][:29]
+        names = names[1::2] + names[::2]
+        Supply.objects.bulk_create([
+            Supply(name=name, price=1, quantity=5, reorder_point=1, location='A1') for name in names
+        ])
+        cls.ordered = list(Supply.objects.order_by('name', 'id').values_list('id', flat=True))
+
+    def page(self, query=''):
+        return keyset_page(Supply.objects.all(), QueryDict(query), per_page=5)
+
+    def ids(self, page):
+        return [supply.id for supply in page]
+
+    def test_walk_forward(self):
+        page = self.page()
+        seen, numbers = self.ids(page), [page.number]
+        while page.has_next:
+            page = self.page(page.next_query)
+            seen += self.ids(page)
+            numbers.append(page.number)
+        self.assertEqual(seen, self.ordered)
+        self.assertEqual(numbers, [1, 2, 3, 4, 5, 6])
+
+    def test_walk_backward_from_last(self):
+        page = self.page('last=1')
+        self.assertEqual(self.ids(page), self.ordered[-5:])
+        self.assertIsNone(page.number)
+        self.assertFalse(page.has_next)
+        seen = self.ids(page)
+        while page.has_previous:
+            page = self.page(page.previous_query)
+            seen = self.ids(page) + seen
+        # 29 supplies: going back stops on a full first page, so it shares its
+        # last supply with the page after it rather than showing four
+        self.assertEqual(page.number, 1)
+        self.assertEqual(seen[:5], self.ordered[:5])
+        self.assertEqual(seen[5:], self.ordered[-(len(seen) - 5):])
+        self.assertEqual(set(seen), set(self.ordered))
+
+    def test_before_returns_the_previous_page(self):
+        page = self.page()
+        for _ in range(3):
+            page = self.page(page.next_query)
+        previous = self.page(page.previous_query)
+        self.assertEqual(self.ids(previous), self.ordered[10:15])
+        self.assertEqual(previous.number, 3)
+
+    def test_page_links_match_walking(self):
+        page = self.page(self.page(self.page().next_query).next_query)
+        self.assertEqual([number for number, _ in page.previous_links + page.next_links], [1, 2, 4, 5])
+        for number, query in page.previous_links + page.next_links:
+            start = (number - 1) * 5
+            self.assertEqual(self.ids(self.page(query)), self.ordered[start:start + 5])
+
+    def test_cursor_ties_on_name_resume_by_id(self):
+        supply = Supply.objects.get(id=self.ordered[7])
+        position = self.ordered.index(supply.id)
+        # A cursor on the same name and a lower id has not passed the supply yet
+        page = self.page('after=' + encode_cursor((supply.name, supply.id - 1), 2))
+        self.assertEqual(self.ids(page), self.ordered[position:position + 5])
+        page = self.page('after=' + encode_cursor((supply.name, supply.id), 2))
+        self.assertEqual(self.ids(page), self.ordered[position + 1:position + 6])
+        page = self.page('before=' + encode_cursor((supply.name, supply.id + 1), 2))
+        self.assertEqual(self.ids(page), self.ordered[position - 4:position + 1])
+
+    def test_invalid_cursor_shows_first_page(self):
+        # The last token decodes, but to [1, 2, 3], which is not a (name, id) key
+        for query in ('after=not-a-cursor', 'before=%25%25', 'after=WzEsMiwzXQ'):
+            page = self.page(query)
+            self.assertEqual(self.ids(page), self.ordered[:5])
+            self.assertEqual(page.number, 1)
+
+
+class TrigramIndexTests(TestCase):
+    """
+    The fuzzy name index only gains stale postings from renames and removals.
+    """
+
+    def test_saves_without_rename_leave_postings_alone(self):
+        index = TrigramIndex()
+        index.add(1, 'Cat Litter')
+        index.add(2, 'Dog Bowl')
+        entries = index.entries
+        index.add(1, 'Cat Litter')
+        self.assertEqual((index.entries, index.stale, index.renamed), (entries, 0, set()))
+
+        index.add(1, 'Cat Litter Deluxe')
+        self.assertEqual(index.renamed, {1})
+        self.assertEqual([match[0] for match in index.search('litter deluxe')], [1])
+        self.assertEqual([match[0] for match in index.search('dog bowl')], [2])
+
+
+class RowCacheTests(TestCase):
+    """
+    Cached table rows are keyed so that any change to what a row shows misses.
+    """
+
+    def setUp(self):
+        caches['fragments'].clear()
+        row_cache_stats.reset()
+        self.client.force_login(User.objects.create_superuser('viewer', 'viewer@example.com', 'pw'))
+        self.tag = Tag.objects.create(name='Squeaky')
+        self.supply = Supply.objects.create(name='Rope Toy', price=3, quantity=8, reorder_point=2, location='T1')
+        Supply.objects.create(name='Ball', price=1, quantity=30, reorder_point=5, location='T2')
+
+    def key(self):
+        supply = Supply.objects.select_related('category', 'forecast').prefetch_related('tags').get(id=self.supply.id)
+        return row_cache_key(supply, 'editor', 1)
+
+    def test_edits_change_the_key(self):
+        key = self.key()
+        self.assertEqual(self.key(), key)
+        self.supply.quantity = 7
+        self.supply.save()
+        edited = self.key()
+        self.assertNotEqual(edited, key)
+        # Tag links are written without saving the supply
+        self.supply.tags.add(self.tag)
+        self.assertNotEqual(self.key(), edited)
+
+    def test_index_renders_only_edited_rows(self):
+        self.client.get('/')
+        self.assertEqual(row_cache_stats.snapshot()['misses'], 2)
+        self.client.get('/')
+        self.assertEqual(row_cache_stats.snapshot()['hits'], 2)
+
+        self.supply.quantity = 1
+        self.supply.save()
+        response = self.client.get('/')
+        self.assertEqual(row_cache_stats.snapshot()['misses'], 3)
+        self.assertRegex(response.content.decode(), r'text-danger">\s*1\s*</span>')
+
+
+class CountCacheTests(TestCase):
+    """
+    Totals are counted once per filter set and catalog version, and capped.
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_login(User.objects.create_superuser('counter', 'counter@example.com', 'pw'))
+
+    def test_catalog_write_changes_the_key(self):
+        Supply.objects.create(name='Kibble', price=1, quantity=5, reorder_point=1, location='Aisle 1')
+        matching = Supply.objects.filter(location__icontains='aisle')
+        self.assertEqual(cached_count(matching, 'location=aisle'), (1, True))
+
+        # Raw SQL does not bump the catalog version, so the cached total is served
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE inventory_supply SET location = 'Shelf' WHERE name = 'Kibble'")
+        self.assertEqual(cached_count(matching, 'location=aisle'), (1, True))
+
+        # A catalog write moves the version, so the next call counts again
+        Supply.objects.create(name='Litter', price=1, quantity=5, reorder_point=1, location='Aisle 2')
+        Supply.objects.create(name='Treats', price=1, quantity=5, reorder_point=1, location='Aisle 3')
+        self.assertEqual(cached_count(matching, 'location=aisle'), (2, True))
+
+    def test_broad_filters_show_capped_totals(self):
+        Supply.objects.bulk_create([
+            Supply(name=f'Supply {i:05}', price=1, quantity=5, reorder_point=1, location='Aisle 1')
+            for i in range(COUNT_LIMIT + 1)
+        ])
+        self.assertContains(self.client.get('/?location=Aisle'), '10,000+ supplies match these filters')
+        self.assertContains(self.client.get('/'), '10,000+ supplies')
+        self.assertContains(self.client.get('/?location=nowhere'), '0 supplies match these filters')
+        Supply.objects.filter(name__gt='Supply 00002').delete()
+        self.assertContains(self.client.get('/'), '3 supplies')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite syntax')
+class QueryPlanTests(TestCase):
+    """
+    Every query the list views run must be served by an index: no full scan of
+    a large table and no sort of an unbounded row set.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('planner', 'planner@example.com', 'pw')
+        cls.category = Category.objects.create(name='Cat Care')
+        cls.tag = Tag.objects.create(name='Catnip')
+        Supply.objects.bulk_create([
+            Supply(name=f'Supply {i:03}', price=1, quantity=i % 7, reorder_point=3,
+                   location=f'Aisle {i % 4}', category=cls.category if i % 2 else None)
+            for i in range(60)
+        ])
+        Supply.tags.through.objects.bulk_create([
+            Supply.tags.through(supply_id=supply_id, tag_id=cls.tag.id)
+            for supply_id in Supply.objects.values_list('id', flat=True)[::3]
+        ])
+        AuditLog.objects.bulk_create([
+            AuditLog(supply_name=f'Supply {i:03}', action='CREATE' if i % 2 else 'UPDATE', user=cls.user)
+            for i in range(60)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def assertIndexedQueries(self, url):
+        # Start cold so cached counts and rendered rows do not hide queries
+        caches['default'].clear()
+        caches['fragments'].clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        partial = partial_indexes()
+        with connection.cursor() as cursor:
+            for query in queries.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = [row[3] for row in cursor.fetchall()]
+                with self.subTest(url=url, sql=sql[:120]):
+                    self.assertEqual(plan_problems(sql, plan, partial), [], plan)
+        return response
+
+    def test_supply_list(self):
+        response = self.assertIndexedQueries('/')
+        next_query = response.context['supplies'].next_query
+        self.assertIndexedQueries(f'/?{next_query}')
+        self.assertIndexedQueries('/?last=1')
+
+    def test_supply_list_filters(self):
+        self.assertIndexedQueries(f'/?category={self.category.id}')
+        self.assertIndexedQueries(f'/?tag={self.tag.id}')
+        self.assertIndexedQueries(f'/?category={self.category.id}&tag={self.tag.id}')
+        self.assertIndexedQueries('/?location=aisle+1')
+        self.assertIndexedQueries('/?search=supply')
+
+    def test_low_stock(self):
+        self.assertIndexedQueries('/low-stock/')
+
+    def test_audit_log(self):
+        self.assertIndexedQueries('/audit-log/')
+        self.assertIndexedQueries('/audit-log/?page=2')
+        self.assertIndexedQueries('/audit-log/?action=CREATE')
+        self.assertIndexedQueries(f'/audit-log/?user={self.user.id}')
+        self.assertIndexedQueries('/audit-log/?date_from=2024-01-01&date_to=2030-01-01')
+
+    def test_plan_check_catches_scans_and_sorts(self):
+        self.assertEqual(plan_problems('SELECT ...', ['SCAN inventory_supply']), ['full scan of inventory_supply'])
+        self.assertEqual(
+            plan_problems('SELECT ...', ['SCAN inventory_supply USING INDEX name_idx']),
+            ['full scan of inventory_supply through name_idx'],
+        )
+        self.assertEqual(plan_problems('SELECT ... LIMIT 21', ['SCAN inventory_supply USING INDEX name_idx']), [])
+        self.assertEqual(
+            plan_problems('SELECT ...', ['SEARCH inventory_supply USING INDEX x (category_id=?)',
+                                         'USE TEMP B-TREE FOR ORDER BY']),
+            ['temporary sort'],
+        )
+
+
+
+class LowStockFlagTests(TestCase):
+    """
+    The stored low_stock flag follows quantity and reorder point even without
+    the SQLite triggers that correct it, and wrong flags can be repaired.
+    """
+
+    def setUp(self):
+        # The triggers fix any write that leaves the flag wrong; dropping them
+        # (undone with the test transaction) checks the application paths alone
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('DROP TRIGGER inventory_supply_low_stock_insert')
+                cursor.execute('DROP TRIGGER inventory_supply_low_stock_update')
+        self.low = Supply.objects.create(name='Kibble', price=1, quantity=2, reorder_point=3, location='A1')
+        self.stocked = Supply.objects.create(name='Litter', price=1, quantity=10, reorder_point=3, location='B2')
+        self.steady = Supply.objects.create(name='Treats', price=1, quantity=5, reorder_point=3, location='C3')
+
+    def flags(self):
+        return dict(Supply.objects.values_list('name', 'low_stock'))
+
+    def test_repair_fixes_flags_corrupted_by_raw_sql(self):
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE inventory_supply SET low_stock = NOT low_stock WHERE id IN (%s, %s)',
+                           [self.low.id, self.stocked.id])
+        self.assertEqual(self.flags(), {'Kibble': False, 'Litter': True, 'Treats': False})
+
+        out = io.StringIO()
+        call_command('repair_low_stock', '--dry-run', stdout=out)
+        self.assertIn('Found 2 wrong', out.getvalue())
+        self.assertEqual(self.flags()['Kibble'], False)
+
+        out = io.StringIO()
+        call_command('repair_low_stock', '--batch-size', '1', stdout=out)
+        self.assertIn('Checked 3 supplies. Repaired 2 wrong', out.getvalue())
+        self.assertEqual(self.flags(), {'Kibble': True, 'Litter': False, 'Treats': False})
+
+    def test_save_with_update_fields_keeps_flag(self):
+        self.stocked.quantity = 1
+        self.stocked.save(update_fields=['quantity'])
+        self.low.reorder_point = 1
+        self.low.save(update_fields=['reorder_point'])
+        self.assertEqual(self.flags(), {'Kibble': False, 'Litter': True, 'Treats': False})
+
+        self.stocked.quantity = 4
+        self.stocked.save(update_fields=['quantity'])
+        self.assertEqual(self.flags()['Litter'], False)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'alerts are enqueued by SQLite triggers')
+class LowStockAlertTests(TestCase):
+    """
+    Reorder point crossings are enqueued by every write path and delivered
+    once per supply per dedupe window.
+    """
+
+    def setUp(self):
+        self.supply = Supply.objects.create(name='Kibble', price=1, quantity=10, reorder_point=3, location='A1')
+
+    def test_crossings_are_enqueued_on_every_write_path(self):
+        self.supply.quantity = 3
+        self.supply.save()
+        Supply.objects.filter(id=self.supply.id).update(quantity=F('quantity') + 5)
+        Supply.objects.filter(id=self.supply.id).update(quantity=0)
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE inventory_supply SET quantity = 9 WHERE id = %s', [self.supply.id])
+            cursor.execute('UPDATE inventory_supply SET reorder_point = 12 WHERE id = %s', [self.supply.id])
+        Supply.objects.filter(id=self.supply.id).update(quantity=1)
+        Supply.objects.create(name='Litter', price=1, quantity=0, reorder_point=2, location='B2')
+        self.assertEqual(
+            list(LowStockAlert.objects.order_by('id').values_list('supply_name', 'quantity', 'reorder_point')),
+            [('Kibble', 3, 3), ('Kibble', 0, 3), ('Kibble', 9, 12), ('Litter', 0, 2)],
+        )
+
+    def test_digest_dedupes_within_window(self):
+        Supply.objects.filter(id=self.supply.id).update(quantity=1)
+        Supply.objects.filter(id=self.supply.id).update(quantity=8)
+        Supply.objects.filter(id=self.supply.id).update(quantity=2)
+        restocked = Supply.objects.create(name='Litter', price=1, quantity=0, reorder_point=2, location='B2')
+        Supply.objects.filter(id=restocked.id).update(quantity=50)
+
+        result = deliver_alerts(recipients=['manager@example.com'])
+        self.assertEqual((result['sent'], result['resolved']), (1, 1))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('Kibble (A1): 2 in stock', mail.outbox[0].body)
+        self.assertNotIn('Litter', mail.outbox[0].body)
+        self.assertFalse(LowStockAlert.objects.filter(status='PENDING').exists())
+
+        # Flapping again inside the window is recorded but not emailed
+        Supply.objects.filter(id=self.supply.id).update(quantity=8)
+        Supply.objects.filter(id=self.supply.id).update(quantity=0)
+        result = deliver_alerts(recipients=['manager@example.com'])
+        self.assertEqual((result['sent'], result['suppressed']), (0, 1))
+        self.assertEqual(len(mail.outbox), 1)
+
+        # Once the window has passed the next crossing is emailed
+        Supply.objects.filter(id=self.supply.id).update(quantity=8)
+        Supply.objects.filter(id=self.supply.id).update(quantity=0)
+        result = deliver_alerts(recipients=['manager@example.com'], window=0)
+        self.assertEqual(result['sent'], 1)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_failed_send_leaves_alerts_pending(self):
+        User.objects.create_superuser('manager', 'manager@example.com', 'pw')
+        Supply.objects.filter(id=self.supply.id).update(quantity=1)
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch('inventory.alerts.send_mail', side_effect=SMTPException('connection refused')), \
+                self.assertLogs('inventory.alerts', 'ERROR'):
+            call_command('send_low_stock_alerts', '--once', stdout=out, stderr=err)
+        self.assertIn('Digest not sent, 1 alert(s) left pending', err.getvalue())
+        self.assertEqual(LowStockAlert.objects.filter(status='PENDING').count(), 1)
+
+        # The next run delivers them
+        result = deliver_alerts()
+        self.assertEqual(result['sent'], 1)
+        self.assertFalse(LowStockAlert.objects.filter(status='PENDING').exists())
+
+
+class StockForecastTests(TestCase):
+    """
+    Usage rates come from the audit log's stock decreases only.
+    """
+
+    def test_steady_usage(self):
+        steady = Supply.objects.create(name='Kibble', price=1, quantity=30, reorder_point=3, location='A1')
+        restocked = Supply.objects.create(name='Litter', price=1, quantity=30, reorder_point=3, location='B2')
+        AuditLog.objects.bulk_create([
+            AuditLog(supply=steady, supply_name='Kibble', action='UPDATE', quantity_change=-2) for _ in range(60)
+        ] + [AuditLog(supply=restocked, supply_name='Litter', action='IMPORT', quantity_change=50)])
+        now = timezone.now()
+        for age, log_id in enumerate(AuditLog.objects.filter(supply=steady).values_list('id', flat=True)):
+            AuditLog.objects.filter(id=log_id).update(timestamp=now - timedelta(days=age + 0.5))
+
+        for method in ('mean', 'ewma'):
+            with self.subTest(method=method):
+                result = update_forecasts(method=method)
+                self.assertEqual((result['supplies'], result['events'], result['forecast']), (2, 60, 1))
+                supply = Supply.objects.select_related('forecast').get(id=steady.id)
+                self.assertAlmostEqual(supply.forecast.daily_usage, 2, delta=0.05)
+                self.assertAlmostEqual(supply.days_until_stockout, 15, delta=0.5)
+        self.assertFalse(StockForecast.objects.filter(supply=restocked).exists())
+        self.assertIsNone(Supply.objects.select_related('forecast').get(id=restocked.id).days_until_stockout)
+
+
+class ReorderPointTuningTests(TestCase):
+    """
+    Recommended reorder points cover lead time demand plus safety stock.
+    """
+
+    def test_recommend_and_apply(self):
+        busy = Supply.objects.create(name='Kibble', price=1, quantity=20, reorder_point=3, location='A1')
+        quiet = Supply.objects.create(name='Litter', price=1, quantity=2, reorder_point=3, location='B2')
+        # 1 unit used on even days and 3 on odd days: mean 2, standard deviation 1
+        AuditLog.objects.bulk_create([
+            AuditLog(supply=busy, supply_name='Kibble', action='UPDATE', quantity_change=-(1 + 2 * (day % 2)))
+            for day in range(28)
+        ])
+        now = timezone.now()
+        for day, log_id in enumerate(AuditLog.objects.filter(supply=busy).order_by('id').values_list('id', flat=True)):
+            AuditLog.objects.filter(id=log_id).update(timestamp=now - timedelta(days=day + 0.5))
+
+        recommendation = recommend_reorder_points(lead_time=4, service_level=0.95, history_days=28)
+        # 2 * 4 + 1.645 * 1 * sqrt(4) = 11.29
+        self.assertEqual(recommendation['recommended'].tolist(), [12, 3])
+        self.assertEqual(recommendation['accepted'].tolist(), [0])
+        self.assertEqual(projected_alert_volume(recommendation),
+                         {'low_now': 1, 'low_after': 1, 'enter': 0, 'leave': 0})
+
+        Supply.objects.filter(id=busy.id).update(quantity=10)
+        self.assertEqual(apply_reorder_points(recommendation), 1)
+        busy.refresh_from_db()
+        quiet.refresh_from_db()
+        self.assertEqual((busy.reorder_point, busy.low_stock), (12, True))
+        self.assertEqual((quiet.reorder_point, quiet.low_stock), (3, True))
@@ -7,6 +7,9 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('low-stock/', views.low_stock_supplies, name='low_stock'),
     path('audit-log/', views.audit_log, name='audit_log'),
+    path('api/typeahead/', views.supply_typeahead, name='supply_typeahead'),
+    path('api/suggest/', views.suggest, name='suggest'),
+    path('api/row-cache-stats/', views.supply_row_cache_stats, name='supply_row_cache_stats'),
     
     # Supply URLs
     path('supplies/add/', views.add_supply, name='add_supply'),
@@ -16,6 +19,8 @@ urlpatterns = [
     path('supplies/export/', views.export_supplies, name='export_supplies'),
     path('supplies/import/', views.import_all_supplies, name='import_all_supplies'),
     path('supplies/import/template/', views.download_import_template, name='download_import_template'),
+    path('supplies/import/jobs/<int:job_id>/', views.import_job_status, name='import_job_status'),
+    path('supplies/import/jobs/<int:job_id>/errors/', views.import_job_errors, name='import_job_errors'),
     
     # Category URLs
     path('categories/', views.category_list, name='category_list'),
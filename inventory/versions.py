@@ -0,0 +1,47 @@
+# Data Versions Module
+# Version stamps that change on every write to a group of tables, used to key
+# caches so they never need to be invalidated entry by entry
+
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .models import DataVersion
+
+# Supplies, categories, tags and supply tag links
+CATALOG = 'catalog'
+
+# Categories and tags only, for the dropdown cache (see reference)
+REFERENCE = 'reference'
+
+
+def get_version(key=CATALOG):
+    """
+    Return the current version of a group of tables
+
+    Args:
+        key (str, optional): Version key. Defaults to CATALOG.
+
+    Returns:
+        int: Version number, 0 if the group has never been written
+    """
+    return DataVersion.objects.filter(key=key).values_list('version', flat=True).first() or 0
+
+
+def bump_version(key=CATALOG):
+    """
+    Increment the version of a group of tables
+
+    Runs in the caller's transaction, so a rolled back write does not
+    change the version either.
+
+    Args:
+        key (str, optional): Version key. Defaults to CATALOG.
+    """
+    if DataVersion.objects.filter(key=key).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            DataVersion.objects.create(key=key, version=1)
+    except IntegrityError:
+        # Created concurrently by another writer
+        DataVersion.objects.filter(key=key).update(version=F('version') + 1)
@@ -1,17 +1,39 @@
 from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db import models
-from .models import Supply, AuditLog, Category, Tag, User
+from .models import Supply, AuditLog, Category, Tag, User, ImportJob
 from .forms import SupplyForm, CategoryForm, TagForm
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
-import csv
-from django.http import HttpResponse, FileResponse
+import io
+import os
+import re
+from django.http import (
+    HttpResponse, HttpResponseBadRequest, FileResponse, JsonResponse, Http404, StreamingHttpResponse,
+)
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
 from .forms import UploadFileForm
+from .exporters import EXPORT_FORMATS, export_supplies_stream, snapshot_path, write_snapshot
+from .filters import supply_filters, filter_supplies, filter_query_string, filter_signature
+from .fragments import row_cache_stats
+from .fuzzy import fuzzy_supply_ids, supply_names
+from .pagination import keyset_page, ranked_page, cached_count
+from .reference import reference_data
+from .search import SEARCH_LIMIT, ranked_supply_ids
+from .suggest import SUGGEST_FIELDS, suggestions
+from .versions import CATALOG, get_version
+from .importers import detect_format, import_supply_receipts
+from .uploadhandlers import spool_uploads
 from django.views.decorators.csrf import csrf_exempt
 from django.core.paginator import Paginator
 from django.contrib.auth.hashers import make_password
 from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import datetime, timedelta
+
+# Close matches listed when a search finds nothing as typed
+FUZZY_LIMIT = 20
 
 # Helper function to check if user is editor or admin
 def is_editor_or_admin(user):
@@ -19,54 +41,108 @@ def is_editor_or_admin(user):
 
 def index(request):
     # Get filter parameters
-    category_id = request.GET.get('category')
-    tag_id = request.GET.get('tag')
-    location_query = request.GET.get('location', '')
-    search_query = request.GET.get('search', '')
-    
+    filters = supply_filters(request.GET)
+
     # Start with all supplies
-    supplies = Supply.objects.all().select_related('category').prefetch_related('tags')
-    
-    # Apply filters if provided
-    if category_id:
-        supplies = supplies.filter(category_id=category_id)
-    if tag_id:
-        supplies = supplies.filter(tags__id=tag_id)
-    if location_query:
-        supplies = supplies.filter(location__icontains=location_query)
-    if search_query:
-        supplies = supplies.filter(
-            models.Q(name__icontains=search_query) |
-            models.Q(location__icontains=search_query)
-        )
-    
-    # Order by name
-    supplies = supplies.order_by('name')
-    
-    # Pagination
-    paginator = Paginator(supplies, 20)  # Show 20 supplies per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    supplies = Supply.objects.all().select_related('category', 'forecast').prefetch_related('tags')
+    filter_query = filter_query_string(filters)
+    filtered_total = None
+    result_count = None
+    fuzzy_results = False
+
+    # Searches are ranked by relevance within the other filters
+    ranked_ids = None
+    if filters['search']:
+        others = {**filters, 'search': ''}
+        restrict = filter_supplies(Supply.objects.all(), others) if filter_query_string(others) else None
+        ranked_ids = ranked_supply_ids(filters['search'], restrict)
+        # Nothing matched as typed: offer names that are close to it instead
+        if not ranked_ids and (ranked_ids is not None or not filter_supplies(Supply.objects.all(), filters).exists()):
+            fuzzy_ids = fuzzy_supply_ids(filters['search'], restrict, limit=FUZZY_LIMIT)
+            if fuzzy_ids:
+                ranked_ids = fuzzy_ids
+                fuzzy_results = True
+    if ranked_ids is not None:
+        page_obj = ranked_page(supplies, ranked_ids, request.GET, per_page=20)
+        result_count = len(ranked_ids)
+    else:
+        # Keyset pagination on (name, id): deep pages cost the same as the first
+        filtered = filter_supplies(supplies, filters)
+        page_obj = keyset_page(filtered, request.GET, per_page=20)
+        # Counted once per filter set and catalog version, capped for broad filters
+        count, exact = cached_count(filtered, filter_signature(filters))
+        filtered_total = {'count': count, 'exact': exact}
     
-    # Get all categories and tags for the filter dropdowns
-    categories = Category.objects.all()
-    tags = Tag.objects.all()
+    # Categories and tags for the filter dropdowns, from the reference data cache
+    categories, tags = reference_data()
     
     context = {
         'supplies': page_obj,
         'categories': categories,
         'tags': tags,
-        'selected_category': category_id,
-        'selected_tag': tag_id,
-        'location_query': location_query,
-        'search_query': search_query,
+        'selected_category': filters['category'],
+        'selected_tag': filters['tag'],
+        'location_query': filters['location'],
+        'search_query': filters['search'],
+        'filter_query': filter_query,
+        'page_query': f'{filter_query}&' if filter_query else '',
+        'filtered_total': filtered_total,
+        'result_count': result_count,
+        'search_limit': SEARCH_LIMIT,
+        'fuzzy_results': fuzzy_results,
     }
     
     return render(request, 'inventory/index.html', context)
 
+def supply_typeahead(request):
+    """
+    Suggest supply names for the search box, tolerating typos
+
+    Query parameters: q (the text typed so far) and limit (at most 20).
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 20)
+    except ValueError:
+        limit = 10
+    matches = supply_names.search(query, limit) if len(query) >= 2 else []
+    return JsonResponse({
+        'results': [{'id': supply_id, 'name': name, 'score': score} for supply_id, name, score in matches],
+    })
+
+def suggest(request):
+    """
+    Complete the text typed in a filter box from the in-memory prefix indexes
+
+    Query parameters: q (the text typed so far), fields (comma separated
+    subset of name, location, category and tag; all by default) and limit
+    (completions per field, at most 20).
+    """
+    query = request.GET.get('q', '').strip()
+    fields = [field for field in request.GET.get('fields', '').split(',') if field in SUGGEST_FIELDS]
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), 20)
+    except ValueError:
+        limit = 8
+    response = JsonResponse(suggestions.complete(query, fields or SUGGEST_FIELDS, limit))
+    # Completions may lag the catalog by a few seconds anyway
+    response['Cache-Control'] = 'private, max-age=5'
+    return response
+
+@login_required
+@user_passes_test(is_editor_or_admin)
+def supply_row_cache_stats(request):
+    """
+    Hit and miss counts of this worker's supply row cache; ?reset=1 clears them
+    """
+    stats = row_cache_stats.snapshot()
+    if request.GET.get('reset'):
+        row_cache_stats.reset()
+    return JsonResponse({'pid': os.getpid(), **stats})
+
 @login_required
 def low_stock_supplies(request):
-    low_stock_items = Supply.objects.filter(quantity__lte=models.F('reorder_point'))
+    low_stock_items = Supply.objects.filter(low_stock=True).select_related('forecast')
     return render(request, 'inventory/low_stock.html', {'low_stock_items': low_stock_items})
 
 def custom_login(request):
@@ -85,18 +161,88 @@ def logout_view(request):
     logout(request)
     return redirect('index')
 
+def ranged_file_response(request, path, content_type, filename, etag):
+    """
+    Serve a file with support for a single HTTP byte range, for resumable downloads.
+    
+    Args:
+        request (HttpRequest): The request, possibly carrying Range and If-Range headers
+        path (Path): File to serve
+        content_type (str): Content type of the file
+        filename (str): Download file name
+        etag (str): ETag of the file, compared against If-Range
+    
+    Returns:
+        HttpResponse: 200 with the whole file, 206 with the requested range, or 416
+    """
+    size = path.stat().st_size
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', request.META.get('HTTP_RANGE', '').strip())
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if match and any(match.groups()) and (not if_range or if_range == etag):
+        first, last = match.groups()
+        if first:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(0, size - int(last)), size - 1
+        if start >= size or end < start:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        def read_range(f, remaining):
+            with f:
+                f.seek(start)
+                while remaining > 0:
+                    block = f.read(min(remaining, 64 * 1024))
+                    if not block:
+                        break
+                    remaining -= len(block)
+                    yield block
+
+        response = StreamingHttpResponse(read_range(open(path, 'rb'), end - start + 1),
+                                         status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    else:
+        response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
 @login_required
 def export_supplies(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="supplies.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['Name', 'Price', 'Quantity', 'Location'])  # Header row
-    for supply in Supply.objects.all():
-        writer.writerow([supply.name, supply.price, supply.quantity, supply.location])
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest(f'Unsupported export format "{export_format}"')
+    extension, content_type, _ = EXPORT_FORMATS[export_format]
+    filename = f'supplies.{extension}'
+    filters = supply_filters(request.GET)
+
+    # Exports are materialised once per catalog version, then served from disk
+    path = snapshot_path(export_format, filter_query_string(filters), get_version(CATALOG))
+    etag = f'"{path.name}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if not path.exists():
+            # Same filters as the index page, applied in SQL
+            supplies = filter_supplies(Supply.objects.all(), filters)
+            chunks = write_snapshot(export_supplies_stream(export_format, supplies), path)
+            if 'HTTP_RANGE' in request.META:
+                for _ in chunks:
+                    pass
+            else:
+                # Stream rows straight from the cursor so memory stays flat at any catalog size
+                response = StreamingHttpResponse(chunks, content_type=content_type)
+                response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        if response is None:
+            response = ranged_file_response(request, path, content_type, filename, etag)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
 @login_required
 @user_passes_test(is_editor_or_admin)
+@spool_uploads
 def import_supplies(request, supply_id):
     supply = get_object_or_404(Supply, id=supply_id)
     
@@ -107,23 +253,10 @@ def import_supplies(request, supply_id):
                 file = request.FILES['file']
                 if file.name.endswith('.csv'):
                     # Handle CSV import
-                    reader = csv.reader(file)
-                    next(reader)  # Skip header
-                    for row in reader:
-                        if len(row) >= 2:
-                            quantity = int(row[1])
-                            supply.quantity += quantity
-                            supply.save()
-                            
-                            # Log the import
-                            AuditLog.objects.create(
-                                supply=supply,
-                                action='IMPORT',
-                                quantity=quantity,
-                                user=request.user
-                            )
-                            
-                    messages.success(request, f'Successfully imported supplies for {supply.name}')
+                    text_file = io.TextIOWrapper(file.file, encoding='utf-8', newline='')
+                    rows, total = import_supply_receipts(supply, text_file, request.user)
+
+                    messages.success(request, f'Successfully imported {total} units from {rows} rows for {supply.name}')
                     return redirect('index')
                 else:
                     messages.error(request, 'Please upload a CSV file')
@@ -139,77 +272,99 @@ def import_supplies(request, supply_id):
 
 @login_required
 @user_passes_test(is_editor_or_admin)
+@spool_uploads
 def import_all_supplies(request):
     """
-    Bulk import supplies from a CSV file.
+    Queue a bulk import of supplies from a CSV or JSON Lines file, optionally gzip-compressed.
     CSV format: Name, Category, Tags, Price, Quantity, Reorder Point, Location
+    The format is detected from the file contents, not its name.
+    The upload is stored on an ImportJob and processed by the process_import_jobs worker.
     """
     if request.method == 'POST':
         form = UploadFileForm(request.POST, request.FILES)
         if form.is_valid():
+            file = request.FILES['file']
             try:
-                file = request.FILES['file']
-                if file.name.endswith('.csv'):
-                    # Open the file in text mode
-                    csv_file = file.read().decode('utf-8').splitlines()
-                    reader = csv.reader(csv_file)
-                    next(reader)  # Skip header
-                    imported_count = 0
-                    for row in reader:
-                        if len(row) >= 7:
-                            name = row[0]
-                            category_name = row[1]
-                            tag_names = row[2].split()
-                            price = float(row[3].replace('$', ''))
-                            quantity = int(row[4])
-                            reorder_point = int(row[5])
-                            location = row[6]
-                            
-                            # Get or create category
-                            category, _ = Category.objects.get_or_create(name=category_name)
-                            
-                            # Get or create tags
-                            tags = []
-                            for tag_name in tag_names:
-                                tag, _ = Tag.objects.get_or_create(name=tag_name)
-                                tags.append(tag)
-                            
-                            # Get or create supply
-                            supply, created = Supply.objects.get_or_create(
-                                name=name,
-                                defaults={
-                                    'category': category,
-                                    'price': price,
-                                    'quantity': quantity,
-                                    'reorder_point': reorder_point,
-                                    'location': location
-                                }
-                            )
-                            
-                            if not created:
-                                supply.category = category
-                                supply.price = price
-                                supply.quantity = quantity
-                                supply.reorder_point = reorder_point
-                                supply.location = location
-                                supply.save()
-                            
-                            supply.tags.set(tags)
-                            imported_count += 1
-                    
-                    messages.success(request, f'Successfully imported {imported_count} supplies.')
-                    return redirect('index')
-                else:
-                    messages.error(request, 'Please upload a CSV file')
-            except Exception as e:
-                messages.error(request, f'Error importing supplies: {str(e)}')
+                detect_format(file)
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                job = ImportJob.objects.create(
+                    file=file,
+                    original_name=file.name,
+                    file_hash=getattr(file, 'sha256', ''),
+                    user=request.user,
+                    only_changes=form.cleaned_data['only_changes'],
+                    dry_run=form.cleaned_data['dry_run'],
+                )
+                if 'application/json' in request.headers.get('Accept', ''):
+                    return JsonResponse({
+                        'job_id': job.id,
+                        'status_url': reverse('import_job_status', args=[job.id]),
+                    }, status=202)
+                messages.success(request, f'Import #{job.id} queued. Progress is shown below.')
+                return redirect(f"{reverse('import_all_supplies')}?job={job.id}")
     else:
         form = UploadFileForm()
     return render(request, 'inventory/import_supplies.html', {
         'form': form,
-        'is_bulk_import': True
+        'is_bulk_import': True,
+        'job_id': request.GET.get('job'),
     })
 
+@login_required
+@user_passes_test(is_editor_or_admin)
+def import_job_status(request, job_id):
+    """
+    Report the progress of a queued or running import job as JSON.
+    """
+    job = get_object_or_404(ImportJob, id=job_id)
+    return JsonResponse({
+        'job_id': job.id,
+        'file': job.original_name,
+        'status': job.status,
+        'only_changes': job.only_changes,
+        'dry_run': job.dry_run,
+        'rows_done': job.rows_done,
+        'rows_per_second': job.rows_per_second,
+        'created': job.created_count,
+        'updated': job.updated_count,
+        'unchanged': job.unchanged_count,
+        'resumed_from_row': job.resumed_from_row,
+        'error_count': job.error_count,
+        'error_report_url': reverse('import_job_errors', args=[job.id]) if job.error_report else None,
+        'errors': job.errors,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    })
+
+@login_required
+@user_passes_test(is_editor_or_admin)
+def import_job_errors(request, job_id):
+    """
+    Download the CSV of rows an import job rejected.
+    """
+    job = get_object_or_404(ImportJob, id=job_id)
+    if not job.error_report:
+        raise Http404('This import has no rejected rows.')
+    return FileResponse(job.error_report.open('rb'), as_attachment=True, filename=f'import_{job.id}_errors.csv')
+
+def parse_day(value):
+    """
+    Parse a YYYY-MM-DD query parameter, returning None if it is not a valid date
+    """
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+def start_of_day(day):
+    """
+    Return midnight at the start of a date in the current time zone
+    """
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
 @login_required
 def audit_log(request):
     # Get filter parameters
@@ -226,10 +381,13 @@ def audit_log(request):
         logs = logs.filter(action=action)
     if user_id:
         logs = logs.filter(user_id=user_id)
-    if date_from:
-        logs = logs.filter(timestamp__date__gte=date_from)
-    if date_to:
-        logs = logs.filter(timestamp__date__lte=date_to)
+    # Dates are compared as a timestamp range so the timestamp indexes apply
+    day_from = parse_day(date_from)
+    day_to = parse_day(date_to)
+    if day_from:
+        logs = logs.filter(timestamp__gte=start_of_day(day_from))
+    if day_to:
+        logs = logs.filter(timestamp__lt=start_of_day(day_to + timedelta(days=1)))
     
     # Pagination
     paginator = Paginator(logs, 20)  # Show 20 logs per page
@@ -262,7 +420,8 @@ def add_supply(request):
                 supply_name=supply.name,
                 action='CREATE',
                 user=request.user,
-                details=f"Created new supply: {supply.name}"
+                details=f"Created new supply: {supply.name}",
+                quantity_change=supply.quantity,
             )
             messages.success(request, f'New supply "{supply.name}" has been added.')
             return redirect('index')
@@ -296,9 +455,11 @@ def delete_supply(request, supply_id):
 def edit_supply(request, supply_id):
     supply = get_object_or_404(Supply, id=supply_id)
     if request.method == 'POST':
+        # Taken before validation, which copies the posted values onto the instance
+        old_data = f'{supply.name}, {supply.price}, {supply.quantity}, {supply.location}'
+        old_quantity = supply.quantity
         form = SupplyForm(request.POST, instance=supply)
         if form.is_valid():
-            old_data = f'{supply.name}, {supply.price}, {supply.quantity}, {supply.location}'
             supply = form.save()
             new_data = f'{supply.name}, {supply.price}, {supply.quantity}, {supply.location}'
 
@@ -306,7 +467,8 @@ def edit_supply(request, supply_id):
                 user=request.user,
                 action='UPDATE',
                 supply=supply,
-                details=f'Updated supply: From {old_data} to {new_data}'
+                details=f'Updated supply: From {old_data} to {new_data}',
+                quantity_change=supply.quantity - old_quantity,
             )
             messages.success(request, 'Supply updated successfully!')
             return redirect('index')